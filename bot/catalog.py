@@ -0,0 +1,557 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import re
+import sys
+import time
+from collections import OrderedDict, defaultdict
+
+logger = logging.getLogger(__name__)
+
+# "&" and "and" only separate when spaced, so "AT&T" stays one tag.
+TAG_SEPARATORS = re.compile(r"[,/;|\n]+|\s+&\s+")
+AND_SEPARATOR = re.compile(r"\s+and\s+", re.IGNORECASE)
+PARENTHETICAL = re.compile(r"\(([^)]*)\)")
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'problems.json')
+ROW_FIELDS = ('Topics', 'Question', 'Companies', 'Difficulty')
+
+# Spellings on either side (sheet cells and /setup choices) are folded to one
+# canonical tag before indexing or matching.
+TOPIC_ALIASES = {
+    'dp': 'dynamic programming',
+    'linkedlist': 'linked list',
+    'singly linked list': 'linked list',
+    'doubly linked list': 'linked list',
+    'doubly-linked list': 'linked list',
+    'bst': 'binary search tree',
+    'priority queue': 'heap',
+    'min heap': 'heap',
+    'max heap': 'heap',
+    'hash map': 'hash table',
+    'hashmap': 'hash table',
+    'hashing': 'hash table',
+    'two pointer': 'two pointers',
+    'bfs': 'breadth-first search',
+    'breadth first search': 'breadth-first search',
+    'dfs': 'depth-first search',
+    'depth first search': 'depth-first search',
+    'union find': 'union-find',
+    'disjoint set': 'union-find',
+    'prefix sums': 'prefix sum',
+    'matrices': 'matrix',
+    '2d array': 'matrix',
+    '2-d array': 'matrix',
+    '2d matrix': 'matrix',
+    'grid': 'matrix',
+}
+# More specific topics also count as their parents, so a "Tree" preference
+# picks up binary tree questions without substring tests.
+TOPIC_PARENTS = {
+    'binary tree': ('tree',),
+    'binary search tree': ('binary tree', 'tree'),
+    'n-ary tree': ('tree',),
+    'segment tree': ('tree',),
+    'binary indexed tree': ('tree',),
+    'monotonic stack': ('stack',),
+    'monotonic queue': ('queue',),
+    'topological sort': ('graph',),
+    'shortest path': ('graph',),
+    'minimum spanning tree': ('graph',),
+    'matrix': ('array',),
+}
+COMPANY_ALIASES = {
+    'facebook': 'meta',
+    'fb': 'meta',
+    'meta platforms': 'meta',
+    'alphabet': 'google',
+    'msft': 'microsoft',
+    'amazon web services': 'amazon',
+    'aws': 'amazon',
+}
+SINGULAR_EXCEPTIONS = {'bfs', 'dfs', 'two pointers', 'prefix sums', 'dynamic programming'}
+# Topic names that contain "and" but are one tag.
+AND_TOPICS = {'divide and conquer', 'branch and bound'}
+
+
+def split_tags(cell):
+    if not cell:
+        return []
+    tags = []
+    for part in TAG_SEPARATORS.split(str(cell)):
+        part = part.strip().lower()
+        for tag in [part] if _normalize(part) in AND_TOPICS else AND_SEPARATOR.split(part):
+            tag = tag.strip()
+            if tag:
+                tags.append(tag)
+    return tags
+
+
+def _normalize(term):
+    return ' '.join(str(term).replace('_', ' ').split()).lower()
+
+
+def _singular(term):
+    if term in SINGULAR_EXCEPTIONS or term in TOPIC_ALIASES:
+        return term
+    head, _, word = term.rpartition(' ')
+    if len(word) <= 3 or word.endswith('ss'):
+        return term
+    if word.endswith('ies'):
+        # Short ones are -ie nouns ("tries", "ties"); longer ones are -y
+        # ("queries", "strategies").
+        word = word[:-1] if len(word) <= 5 else word[:-3] + 'y'
+    elif word.endswith(('ches', 'shes', 'xes')):
+        word = word[:-2]
+    elif word.endswith('s'):
+        word = word[:-1]
+    return f"{head} {word}" if head else word
+
+
+def canonical_topic(term):
+    term = _singular(_normalize(term))
+    return TOPIC_ALIASES.get(term, term)
+
+
+def canonical_company(term):
+    term = _normalize(term)
+    return COMPANY_ALIASES.get(term, term)
+
+
+def _cell_terms(cell):
+    # "Heap (Priority Queue)" yields both the outer and the bracketed term.
+    for tag in split_tags(cell):
+        inner = PARENTHETICAL.findall(tag)
+        outer = PARENTHETICAL.sub('', tag).strip()
+        for term in [outer] + inner:
+            if term.strip():
+                yield term
+
+
+def topic_terms(cell):
+    terms = []
+    for term in _cell_terms(cell):
+        canonical = canonical_topic(term)
+        for tag in (canonical,) + TOPIC_PARENTS.get(canonical, ()):
+            if tag not in terms:
+                terms.append(tag)
+    return terms
+
+
+def company_terms(cell):
+    terms = []
+    for term in _cell_terms(cell):
+        canonical = canonical_company(term)
+        if canonical not in terms:
+            terms.append(canonical)
+    return terms
+
+
+def question_key(title):
+    return ' '.join(str(title).split()).lower()
+
+
+def question_id(key):
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=6).hexdigest()
+
+
+def question_id_for(question):
+    # Works for catalog records, stored dicts and legacy bare titles alike,
+    # since the id only depends on the normalised title.
+    if isinstance(question, str):
+        return question_id(question_key(question))
+    qid = question.get('id')
+    return qid if qid else question_id(question_key(question.get('Question', '')))
+
+
+def as_question_dict(question):
+    if isinstance(question, Question):
+        return question.to_dict()
+    data = dict(question)
+    data['id'] = question_id_for(question)
+    return data
+
+
+def row_hash(question):
+    payload = '\x1f'.join(str(question.get(field, '')) for field in ROW_FIELDS)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=8).hexdigest()
+
+
+class Question:
+    # Compact catalog record. Repeated strings (difficulty, topic and company
+    # cells and tags) are interned so thousands of rows share them.
+    __slots__ = ('id', 'title', 'topics', 'companies', 'difficulty', 'topic_tags', 'company_tags')
+    FIELDS = {'id': 'id', 'Question': 'title', 'Topics': 'topics', 'Companies': 'companies', 'Difficulty': 'difficulty'}
+
+    def __init__(self, qid, row):
+        self.id = qid
+        self.title = str(row.get('Question', ''))
+        self.topics = sys.intern(str(row.get('Topics', '')))
+        self.companies = sys.intern(str(row.get('Companies', '')))
+        self.difficulty = sys.intern(str(row.get('Difficulty', '')))
+        self.topic_tags = tuple(sys.intern(tag) for tag in topic_terms(self.topics))
+        self.company_tags = tuple(sys.intern(tag) for tag in company_terms(self.companies))
+
+    def __getitem__(self, field):
+        return getattr(self, self.FIELDS[field])
+
+    def get(self, field, default=None):
+        attr = self.FIELDS.get(field)
+        return getattr(self, attr) if attr else default
+
+    def to_dict(self):
+        return {field: getattr(self, attr) for field, attr in self.FIELDS.items()}
+
+
+def keyed_rows(questions):
+    # Rows are identified by a short hash of their normalised title so
+    # reordering the sheet doesn't change identity. Repeated titles get an
+    # occurrence suffix before hashing.
+    seen = defaultdict(int)
+    rows = {}
+    for question in questions:
+        key = question_key(question.get('Question', ''))
+        seen[key] += 1
+        if seen[key] > 1:
+            key = f"{key}#{seen[key]}"
+        qid = question_id(key)
+        rows[qid] = Question(qid, question)
+    return rows
+
+
+class QuestionIndex:
+    def __init__(self, rows=None):
+        self.questions = {}
+        self.all_ids = set()
+        self.by_difficulty = defaultdict(set)
+        self.by_topic = defaultdict(set)
+        self.by_company = defaultdict(set)
+        for qid, question in (rows or {}).items():
+            self.add(qid, question)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def _postings(self, question):
+        yield self.by_difficulty, question.difficulty
+        for tag in question.topic_tags:
+            yield self.by_topic, tag
+        for tag in question.company_tags:
+            yield self.by_company, tag
+
+    def add(self, qid, question):
+        if qid in self.questions:
+            self.remove(qid)
+        self.questions[qid] = question
+        self.all_ids.add(qid)
+        for table, term in self._postings(question):
+            table[term].add(qid)
+
+    def remove(self, qid):
+        question = self.questions.pop(qid, None)
+        if question is None:
+            return
+        self.all_ids.discard(qid)
+        for table, term in self._postings(question):
+            ids = table.get(term)
+            if ids is not None:
+                ids.discard(qid)
+                if not ids:
+                    del table[term]
+
+    def candidate_ids(self, prefs):
+        candidates = self.all_ids
+        difficulty_prefs = prefs.get('difficulty', [])
+        if 'Random' not in difficulty_prefs:
+            ids = set()
+            for difficulty in difficulty_prefs:
+                ids |= self.by_difficulty.get(difficulty, set())
+            candidates = candidates & ids
+        topic_prefs = prefs.get('topic', [])
+        if 'Random' not in topic_prefs:
+            ids = set()
+            for topic in topic_prefs:
+                ids |= self.by_topic.get(canonical_topic(topic), set())
+            candidates = candidates & ids
+        company_prefs = prefs.get('company', [])
+        if 'Random' not in company_prefs and 'No preference' not in company_prefs:
+            ids = set()
+            for company in company_prefs:
+                ids |= self.by_company.get(canonical_company(company), set())
+            candidates = candidates & ids
+        return candidates
+
+    def match(self, prefs, completed_ids=frozenset()):
+        ids = self.candidate_ids(prefs) - completed_ids
+        return [self.questions[qid] for qid in sorted(ids)]
+
+
+def profile_key(prefs):
+    # Normalised (difficulty, topic, company) profile; "Random" and
+    # "No preference" mean the dimension is unfiltered.
+    key = []
+    for field, wildcards in (('difficulty', {'Random'}), ('topic', {'Random'}), ('company', {'Random', 'No preference'})):
+        values = prefs.get(field, [])
+        if wildcards & set(values):
+            key.append(('*',))
+        elif field == 'difficulty':
+            key.append(tuple(sorted({value.strip() for value in values})))
+        elif field == 'topic':
+            key.append(tuple(sorted({canonical_topic(value) for value in values})))
+        else:
+            key.append(tuple(sorted({canonical_company(value) for value in values})))
+    return tuple(key)
+
+
+def parse_weights(spec):
+    # "Easy:1,Medium:2,Hard:1" -> {'Easy': 1.0, 'Medium': 2.0, 'Hard': 1.0}
+    weights = {}
+    for part in (spec or '').split(','):
+        name, _, weight = part.partition(':')
+        try:
+            weights[name.strip()] = float(weight)
+        except ValueError:
+            continue
+    return weights
+
+
+class ProfilePool:
+    __slots__ = ('ids', 'by_difficulty')
+
+    def __init__(self, index, prefs):
+        self.ids = frozenset(index.candidate_ids(prefs))
+        by_difficulty = defaultdict(list)
+        for qid in self.ids:
+            by_difficulty[index.questions[qid].difficulty].append(qid)
+        # Shuffled once per pool, so walking a bucket in order is already a
+        # random permutation.
+        for ids in by_difficulty.values():
+            random.shuffle(ids)
+        self.by_difficulty = {difficulty: tuple(ids) for difficulty, ids in by_difficulty.items()}
+
+
+class ProfileCache:
+    # Candidate pools shared by every user with the same normalised profile.
+    # Keys include the catalog version, so a sync simply stops hitting old
+    # entries and LRU eviction ages them out.
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self._pools = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._pools)
+
+    def get(self, catalog, prefs):
+        key = (profile_key(prefs), catalog.version)
+        pool = self._pools.get(key)
+        if pool is not None:
+            self.hits += 1
+            self._pools.move_to_end(key)
+            return pool
+        self.misses += 1
+        pool = ProfilePool(catalog.index, prefs)
+        self._pools[key] = pool
+        while len(self._pools) > self.capacity:
+            self._pools.popitem(last=False)
+        return pool
+
+
+class PoolWalk:
+    # One pass over a difficulty bucket: a random start and a stride coprime
+    # with its length visit every id exactly once without copying the tuple.
+    __slots__ = ('size', 'start', 'stride', 'position')
+
+    def __init__(self, size):
+        self.size = size
+        self.start = random.randrange(size)
+        self.stride = 1
+        if size > 2:
+            self.stride = random.randrange(1, size)
+            while math.gcd(self.stride, size) != 1:
+                self.stride = random.randrange(1, size)
+        self.position = 0
+
+    @property
+    def remaining(self):
+        return self.size - self.position
+
+    def next_id(self, ids, excluded):
+        while self.position < self.size:
+            qid = ids[(self.start + self.position * self.stride) % self.size]
+            self.position += 1
+            if qid not in excluded:
+                return qid
+        return None
+
+
+class QuestionSampler:
+    # Draws one question for a preference profile without building the
+    # filtered list. A draw picks a difficulty (sized by what is left of it
+    # and an optional weight) and continues the user's walk over that bucket,
+    # so serving a whole pool costs O(pool) in total rather than per draw.
+    # Walks only move forward; once every bucket is walked, one fresh pass
+    # picks up ids that became available again (withdrawn or pending ones).
+    def __init__(self, cache=None, weights=None, capacity=4096):
+        self.cache = cache if cache is not None else ProfileCache()
+        self.weights = weights or {}
+        self.capacity = capacity
+        self._walks = OrderedDict()
+
+    def _walks_for(self, key, pool):
+        if key is None:
+            return {}
+        entry = self._walks.get(key)
+        if entry is not None and entry[0] is pool:
+            self._walks.move_to_end(key)
+            return entry[1]
+        walks = {}
+        self._walks[key] = (pool, walks)
+        while len(self._walks) > self.capacity:
+            self._walks.popitem(last=False)
+        return walks
+
+    def _draw_pass(self, pool, walks, excluded, fresh):
+        buckets = dict(pool.by_difficulty)
+        if fresh:
+            walks.clear()
+        while buckets:
+            difficulties = list(buckets)
+            weights = [
+                self.weights.get(difficulty, 1.0)
+                * (walks[difficulty].remaining if difficulty in walks else len(buckets[difficulty]))
+                for difficulty in difficulties
+            ]
+            if not any(weights):
+                return None
+            difficulty = random.choices(difficulties, weights)[0]
+            ids = buckets.pop(difficulty)
+            walk = walks.get(difficulty)
+            if walk is None:
+                walk = walks[difficulty] = PoolWalk(len(ids))
+            qid = walk.next_id(ids, excluded)
+            if qid is not None:
+                return qid
+        return None
+
+    def draw(self, catalog, prefs, excluded=frozenset(), key=None):
+        # `key` (the user id) keeps a walk across draws; without it every
+        # draw starts a fresh one.
+        pool = self.cache.get(catalog, prefs)
+        walks = self._walks_for(key, pool)
+        qid = self._draw_pass(pool, walks, excluded, fresh=False)
+        if qid is None and key is not None:
+            qid = self._draw_pass(pool, walks, excluded, fresh=True)
+        return catalog.index.questions[qid] if qid is not None else None
+
+
+class CatalogDiff:
+    __slots__ = ('added', 'removed', 'changed', 'revision', 'order')
+
+    def __init__(self, added, removed, changed, revision, order):
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+        self.revision = revision
+        self.order = order
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def __str__(self):
+        return f"+{len(self.added)} -{len(self.removed)} ~{len(self.changed)}"
+
+
+class QuestionCatalog:
+    # Only the refresh job mutates a catalog, and it applies diffs on the
+    # event loop so handlers never see a half-applied update.
+    def __init__(self, questions, loaded_at=None, revision=None):
+        rows = keyed_rows(questions)
+        self.index = QuestionIndex(rows)
+        self.row_hashes = {key: row_hash(question) for key, question in rows.items()}
+        self.order = list(rows)
+        self.loaded_at = loaded_at if loaded_at is not None else time.time()
+        self.revision = revision
+        self.version = self._compute_version()
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def questions(self):
+        return [self.index.questions[key] for key in self.order]
+
+    def _compute_version(self):
+        digest = hashlib.sha256()
+        for key in self.order:
+            digest.update(self.row_hashes[key].encode())
+        return digest.hexdigest()[:16]
+
+    def diff(self, questions, revision=None):
+        rows = keyed_rows(questions)
+        added, changed = {}, {}
+        for key, question in rows.items():
+            old_hash = self.row_hashes.get(key)
+            if old_hash is None:
+                added[key] = question
+            elif old_hash != row_hash(question):
+                changed[key] = question
+        removed = [key for key in self.row_hashes if key not in rows]
+        return CatalogDiff(added, removed, changed, revision, list(rows))
+
+    def apply(self, diff):
+        for key in diff.removed:
+            self.index.remove(key)
+            self.row_hashes.pop(key, None)
+        for rows in (diff.added, diff.changed):
+            for key, question in rows.items():
+                self.index.add(key, question)
+                self.row_hashes[key] = row_hash(question)
+        self.order = diff.order
+        self.revision = diff.revision
+        self.loaded_at = time.time()
+        if diff:
+            self.version = self._compute_version()
+
+    def to_snapshot(self):
+        return {
+            'version': self.version,
+            'revision': self.revision,
+            'saved_at': self.loaded_at,
+            'questions': [question.to_dict() for question in self.questions],
+        }
+
+
+def load_snapshot(path=DEFAULT_SNAPSHOT_PATH):
+    try:
+        with open(path, encoding='utf-8') as f:
+            raw = f.read()
+        if not raw.strip():
+            return None
+        data = json.loads(raw)
+        questions = data.get('questions') or []
+        if not questions:
+            return None
+        catalog = QuestionCatalog(questions, loaded_at=data.get('saved_at', 0), revision=data.get('revision'))
+        logger.info(f"Loaded {len(catalog)} questions from catalog snapshot {path} (version {catalog.version})")
+        return catalog
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"Error loading catalog snapshot {path}: {e}")
+        return None
+
+
+def save_snapshot(snapshot, path=DEFAULT_SNAPSHOT_PATH):
+    try:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        logger.error(f"Error saving catalog snapshot {path}: {e}")
+        return False
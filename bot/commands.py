@@ -13,16 +13,20 @@ from telegram.ext import (
     MessageHandler,
     filters,
 )
-from .models import FirebaseManager, DSAQuestionMatcher, GoogleSheetsManager
+from .models import ActiveQuestionStore, AsyncFirebaseManager, DSAQuestionMatcher
+from .delivery import Delivery, DeliveryEngine, DeliveryLedger
+from . import metrics
+from .metrics import timed_handler
+from .scheduling import MinuteCursor, ScheduleIndex, local_date, stats_periods
+from .sharding import ShardCoordinator
 import asyncio
 import logging
+import os
+import time
+from collections import Counter, defaultdict
 from datetime import datetime, timedelta
-import random
 import pytz
 
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 DIFFICULTY, TOPIC, COMPANY = range(3)
@@ -39,15 +43,35 @@ COMPANIES = [
 ]
 
 class DSABotHandlers:
-    def __init__(self):
-        self.firebase = FirebaseManager()
-        self.sheets = GoogleSheetsManager()
-        self.question_matcher = DSAQuestionMatcher(self.firebase)
-        self.current_questions = {}
+    def __init__(self, firebase_manager=None, question_matcher=None, delivery_engine=None):
+        self.firebase = firebase_manager if firebase_manager else AsyncFirebaseManager()
+        self.question_matcher = question_matcher if question_matcher else DSAQuestionMatcher(self.firebase)
+        self.delivery = delivery_engine if delivery_engine else DeliveryEngine()
+        self.delivery_ledger = DeliveryLedger(self.firebase)
+        self.schedule_index = ScheduleIndex()
+        self.schedule_index_loaded_at = None
+        # 0 keeps the startup load for the life of the process; the write
+        # path (and, when sharded, the last_updated delta) keeps it current.
+        self.schedule_index_refresh = int(os.getenv('SCHEDULE_INDEX_REFRESH', '0'))
+        self._schedule_index_retry_at = 0.0
+        self._schedule_index_backoff = 60.0
+        self._schedule_index_lock = asyncio.Lock()
+        self._schedule_synced_since = None
+        self._schedule_synced_at = 0.0
+        self.shards = ShardCoordinator(self.firebase)
+        # Other workers assign questions to users this one serves, so a
+        # cached entry here could be stale.
+        self.active_questions = ActiveQuestionStore(self.firebase, capacity=0 if self.shards.sharded else None)
         self.question_locks = {}
-        self.is_reminder_running = False
-        self.is_deadline_check_running = False
+        self._running_jobs = set()
+        self.cursors = {}
+        self._cursor_persisted_at = {}
         self._user_busy = {}
+        # Per-kind outcome counts for the running tick, logged once at its end.
+        self.tick_counts = defaultdict(Counter)
+        # Users whose claimed side effects failed to persist, by kind and
+        # UTC minute; retried on the next tick of that kind.
+        self.retry_users = defaultdict(dict)
         logger.info("✅ DSABotHandlers initialized successfully.")
 
     def parse_user_time(self, time_str):
@@ -130,7 +154,7 @@ class DSABotHandlers:
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
         try:
-            user_prefs = self.firebase.get_user_prefs(user_id)
+            user_prefs = await self.firebase.get_user_prefs(user_id)
             if not user_prefs:
                 await update.message.reply_text("Welcome! Please set your preferences using /setup. For getting started use /help.")
             else:
@@ -249,7 +273,7 @@ Happy coding! 💻✨
             )
             return ConversationHandler.END
         self.set_user_busy(user_id, True)
-        existing_prefs = self.firebase.get_user_prefs(user_id)
+        existing_prefs = await self.firebase.get_user_prefs(user_id)
         difficulty_keyboard = []
 
         if existing_prefs and "difficulty" in existing_prefs:
@@ -280,7 +304,7 @@ Happy coding! 💻✨
         context.user_data['difficulty'] = selected
 
         user_id = update.effective_user.id
-        existing_prefs = self.firebase.get_user_prefs(user_id)
+        existing_prefs = await self.firebase.get_user_prefs(user_id)
         topic_keyboard = []
 
         if existing_prefs and "topic" in existing_prefs:
@@ -309,7 +333,7 @@ Happy coding! 💻✨
         context.user_data['topic'] = selected
 
         user_id = update.effective_user.id
-        existing_prefs = self.firebase.get_user_prefs(user_id)
+        existing_prefs = await self.firebase.get_user_prefs(user_id)
         company_keyboard = []
 
         if existing_prefs and "company" in existing_prefs:
@@ -349,7 +373,7 @@ Happy coding! 💻✨
             "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
 
-        self.firebase.set_user_prefs(user_id, prefs)
+        await self.firebase.set_user_prefs(user_id, prefs)
 
         keyboard = [
             [InlineKeyboardButton("⏰ Set Daily Schedule", callback_data="setreminder_help")],
@@ -543,7 +567,8 @@ Happy coding! 💻✨
             'timezone': 'Asia/Karachi'
         }
         try:
-            self.firebase.set_user_reminder_settings(user_id, reminder_settings)
+            await self.firebase.set_user_reminder_settings(user_id, reminder_settings)
+            self.schedule_index.update(user_id, reminder_settings)
             keyboard = [
                 [InlineKeyboardButton("📚 Get First Question", callback_data="next_question")],
                 [InlineKeyboardButton("📊 View Stats", callback_data="stats")]
@@ -584,16 +609,13 @@ Happy coding! 💻✨
             return
         async with self.question_locks.setdefault(user_id, asyncio.Lock()):
             try:
-                questions, error_message = await self.question_matcher.get_matching_questions(user_id)
+                question, error_message = await self.question_matcher.pick_question(user_id)
                 if error_message:
                     await update.effective_message.reply_text(error_message)
                     return
-                if not questions:
-                    await update.effective_message.reply_text("No matching questions found. Please update your preferences.")
+                if not await self.active_questions.assign(user_id, question):
+                    await update.effective_message.reply_text("Could not save your question, please try /question again.")
                     return
-                question = random.choice(questions)
-                self.current_questions[user_id] = question
-                self.firebase.update_question_status(user_id, question['Question'], "pending")
                 await update.effective_message.reply_html(
                     f"Question: {question['Question']}\nDifficulty: {question['Difficulty']}\nUse /done or /missed to mark your progress."
                 )
@@ -601,23 +623,24 @@ Happy coding! 💻✨
                 logger.error(f"Error fetching question: {e}", exc_info=True)
                 await update.effective_message.reply_text(f"Error fetching question: {e}")
 
-    async def done_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def resolve_command(self, update, status):
         user_id = update.effective_user.id
-        question = self.current_questions.pop(user_id, None)
+        try:
+            question = await self.active_questions.resolve(user_id, status)
+        except Exception as e:
+            logger.error(f"Error marking question as {status} for user {user_id}: {e}", exc_info=True)
+            await update.effective_message.reply_text("Could not update your question, please try again.")
+            return
         if not question:
             await update.effective_message.reply_text("No active question found.")
             return
-        self.firebase.update_question_status(user_id, question['Question'], "done")
-        await update.effective_message.reply_text("Question marked as done!")
+        await update.effective_message.reply_text(f"Question marked as {status}!")
+
+    async def done_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await self.resolve_command(update, "done")
 
     async def missed_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        user_id = update.effective_user.id
-        question = self.current_questions.pop(user_id, None)
-        if not question:
-            await update.effective_message.reply_text("No active question found.")
-            return
-        self.firebase.update_question_status(user_id, question['Question'], "missed")
-        await update.effective_message.reply_text("Question marked as missed!")
+        await self.resolve_command(update, "missed")
 
     async def set_reminder_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
@@ -627,7 +650,8 @@ Happy coding! 💻✨
             return
         try:
             reminder_time = datetime.strptime(time_str, "%H:%M").strftime("%H:%M")
-            self.firebase.set_user_reminder_settings(user_id, {'reminder_time_utc': reminder_time})
+            await self.firebase.set_user_reminder_settings(user_id, {'reminder_time_utc': reminder_time})
+            self.schedule_index.update(user_id, {'reminder_time_utc': reminder_time})
             await update.effective_message.reply_text(f"Reminder set for {reminder_time} UTC.")
         except ValueError:
             await update.effective_message.reply_text("Invalid time format. Use HH:MM.")
@@ -644,47 +668,47 @@ Happy coding! 💻✨
 
     def get_conversation_handler(self):
         return ConversationHandler(
-            entry_points=[CommandHandler("setup", self.setup_start)],
+            entry_points=[CommandHandler("setup", timed_handler(self.setup_start))],
             states={
-                DIFFICULTY: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.setup_difficulty)],
-                TOPIC: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.setup_topic)],
-                COMPANY: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.setup_company)],
+                DIFFICULTY: [MessageHandler(filters.TEXT & ~filters.COMMAND, timed_handler(self.setup_difficulty))],
+                TOPIC: [MessageHandler(filters.TEXT & ~filters.COMMAND, timed_handler(self.setup_topic))],
+                COMPANY: [MessageHandler(filters.TEXT & ~filters.COMMAND, timed_handler(self.setup_company))],
             },
             fallbacks=[
-                CommandHandler("cancel", self.setup_cancel),
-                CommandHandler("exit", self.exit_command)
+                CommandHandler("cancel", timed_handler(self.setup_cancel)),
+                CommandHandler("exit", timed_handler(self.exit_command))
             ],
         )
 
     def get_reminder_conversation_handler(self):
         return ConversationHandler(
             entry_points=[
-                CommandHandler("setreminder", self.setreminder_start),
-                CallbackQueryHandler(self.setreminder_start, pattern="^setreminder_help$")
+                CommandHandler("setreminder", timed_handler(self.setreminder_start)),
+                CallbackQueryHandler(timed_handler(self.setreminder_start), pattern="^setreminder_help$")
             ],
             states={
-                PRACTICE_TIME: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.setreminder_practice_time)],
-                DEADLINE_TIME: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.setreminder_deadline_time)],
-                REMINDER_TIME: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.setreminder_reminder_time)],
+                PRACTICE_TIME: [MessageHandler(filters.TEXT & ~filters.COMMAND, timed_handler(self.setreminder_practice_time))],
+                DEADLINE_TIME: [MessageHandler(filters.TEXT & ~filters.COMMAND, timed_handler(self.setreminder_deadline_time))],
+                REMINDER_TIME: [MessageHandler(filters.TEXT & ~filters.COMMAND, timed_handler(self.setreminder_reminder_time))],
             },
             fallbacks=[
-                CommandHandler("cancel", self.setreminder_cancel),
-                CommandHandler("exit", self.exit_command)
+                CommandHandler("cancel", timed_handler(self.setreminder_cancel)),
+                CommandHandler("exit", timed_handler(self.exit_command))
             ],
         )
 
     def get_handlers(self):
         handlers = [
-            CommandHandler("start", self.start_command),
-            CommandHandler("help", self.help_command),
-            CommandHandler("question", self.question_command),
-            CommandHandler("done", self.done_command),
-            CommandHandler("missed", self.missed_command),
-            CommandHandler("set_reminder", self.set_reminder_command),
-            CommandHandler("exit", self.exit_command),
-            CommandHandler("cancel", self.exit_command),
-            CommandHandler("stats", self.stats_command),
-            CallbackQueryHandler(self.handle_callback_query),
+            CommandHandler("start", timed_handler(self.start_command)),
+            CommandHandler("help", timed_handler(self.help_command)),
+            CommandHandler("question", timed_handler(self.question_command)),
+            CommandHandler("done", timed_handler(self.done_command)),
+            CommandHandler("missed", timed_handler(self.missed_command)),
+            CommandHandler("set_reminder", timed_handler(self.set_reminder_command)),
+            CommandHandler("exit", timed_handler(self.exit_command)),
+            CommandHandler("cancel", timed_handler(self.exit_command)),
+            CommandHandler("stats", timed_handler(self.stats_command)),
+            CallbackQueryHandler(timed_handler(self.handle_callback_query)),
         ]
         return handlers
 
@@ -704,129 +728,327 @@ Happy coding! 💻✨
     async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
         try:
-            data = self.firebase.get_user_data(user_id)
-            tracking = self.firebase.get_user_tracking(user_id)
-            streak = data.get("streak", 0)
-            completed = 0
-            missed = 0
-            if tracking:
-                for qdata in tracking.values():
-                    if isinstance(qdata, dict):
-                        if qdata.get("status") == "done":
-                            completed += 1
-                        elif qdata.get("status") == "missed":
-                            missed += 1
+            snapshot = await self.firebase.get_user_snapshot(user_id)
+            stats = await self.firebase.get_user_stats(user_id)
+            today = local_date(snapshot.reminder_settings)
+            streak = snapshot.streak_on(today)
+            periods = stats_periods(today)
+            lines = []
+            for label, period in (("Today", "daily"), ("This week", "weekly"), ("This month", "monthly")):
+                bucket = stats.get(period, {}).get(periods[period], {})
+                lines.append(f"• {label}: ✅ {bucket.get('done', 0)} / ❌ {bucket.get('missed', 0)}")
+            by_difficulty = stats.get("by_difficulty", {})
+            for difficulty in sorted(by_difficulty):
+                counts = by_difficulty[difficulty]
+                lines.append(f"• {difficulty}: ✅ {counts.get('done', 0)} / ❌ {counts.get('missed', 0)}")
+            breakdown = "\n".join(lines)
             await update.effective_message.reply_html(
                 f"📊 <b>Your Stats</b>\n\n"
-                f"✅ Questions Completed: <b>{completed}</b>\n"
-                f"❌ Missed: <b>{missed}</b>\n"
+                f"✅ Questions Completed: <b>{stats.get('done', 0)}</b>\n"
+                f"❌ Missed: <b>{stats.get('missed', 0)}</b>\n"
                 f"🔥 Current Streak: <b>{streak}</b>\n"
+                f"🏆 Longest Streak: <b>{snapshot.longest_streak}</b>\n\n"
+                f"{breakdown}\n"
                 f"\n<i>Use /setup or /setreminder to update your routine!</i>"
             )
         except Exception as e:
             logger.error(f"Error in /stats: {e}", exc_info=True)
             await update.effective_message.reply_text("Could not fetch your stats, please try later.")
 
-    # --- Schedulers (no change, as before) ---
+    # --- Schedulers ---
 
-    async def check_and_send_practice_questions(self, context):
-        now_utc = datetime.utcnow().strftime("%H:%M")
-        user_ids = self.firebase.get_users_with_practice_time(now_utc)
-        for user_id in user_ids:
-            try:
-                last_question_sent_date = self.firebase.get_last_question_sent_date(user_id)
-                today_date = datetime.utcnow().strftime("%Y-%m-%d")
-                if last_question_sent_date == today_date:
-                    logger.info(f"Question already sent today to user {user_id}, skipping.")
-                    continue
-                questions, error_message = await self.question_matcher.get_matching_questions(user_id)
-                if error_message:
-                    logger.error(f"Error fetching questions for user {user_id}: {error_message}")
-                    continue
-                if not questions:
-                    logger.info(f"No matching questions found for user {user_id}")
-                    continue
-                question = random.choice(questions)
-                try:
-                    bot = context.bot
-                    await bot.send_message(
-                        user_id,
-                        f"It's practice time!\nQuestion: {question['Question']}\nDifficulty: {question['Difficulty']}\nUse /done or /missed to mark your progress.",
-                    )
-                    self.current_questions[user_id] = question
-                    self.firebase.update_question_status(user_id, question['Question'], "pending")
-                    self.firebase.update_last_question_sent_date(user_id, today_date)
-                    logger.info(f"Practice question sent to user {user_id} at {now_utc} UTC.")
-                except Exception as e:
-                    logger.error(f"Error sending question to user {user_id}: {e}")
-            except Exception as e:
-                logger.error(f"Error in practice question scheduler for user {user_id}: {e}")
+    async def flush_scheduler_writes(self, batch, job_name):
+        if not len(batch):
+            return set()
+        failed_users = await self.firebase.flush_writes(batch)
+        if failed_users:
+            logger.error(f"{job_name} scheduler could not persist writes for users: {sorted(failed_users, key=str)}")
+        return failed_users
 
-    async def check_and_send_reminders(self, context):
-        if self.is_reminder_running:
-            logger.info("Reminder check is already running, skipping...")
+    async def sync_schedule_index_changes(self):
+        # Sharded workers don't see /setreminder writes handled by the polling
+        # worker, so pull users whose settings changed since the last sync.
+        if time.monotonic() - self._schedule_synced_at < 30:
+            return
+        self._schedule_synced_at = time.monotonic()
+        # The cursor is the newest last_updated seen, a storage timestamp, so
+        # clock skew between workers can't skip a change.
+        changes, self._schedule_synced_since = await self.firebase.get_reminder_settings_updated_since(
+            self._schedule_synced_since
+        )
+        for user_id, settings in changes.items():
+            self.schedule_index.update(user_id, settings)
+
+    async def ensure_schedule_index(self):
+        # Loaded once with a full scan; optionally reloaded every
+        # SCHEDULE_INDEX_REFRESH seconds as a safety net.
+        loaded_at = self.schedule_index_loaded_at
+        if loaded_at is not None and (
+            not self.schedule_index_refresh or time.monotonic() - loaded_at < self.schedule_index_refresh
+        ):
+            if self.shards.sharded:
+                await self.sync_schedule_index_changes()
             return
-        self.is_reminder_running = True
+        if time.monotonic() < self._schedule_index_retry_at:
+            return
+        async with self._schedule_index_lock:
+            if self.schedule_index_loaded_at is not loaded_at:
+                return
+            # Read before the scan, so a change written during it is synced
+            # again rather than missed.
+            synced_since = await self.firebase.get_latest_settings_update()
+            settings_by_user = await self.firebase.get_all_reminder_settings()
+            if settings_by_user is None:
+                # Ticks fall back to the per-minute query meanwhile (or keep
+                # the stale index); back off instead of rescanning every tick.
+                self._schedule_index_retry_at = time.monotonic() + self._schedule_index_backoff
+                logger.error(f"Schedule index load failed, retrying in {self._schedule_index_backoff:.0f}s")
+                self._schedule_index_backoff = min(self._schedule_index_backoff * 2, 1800.0)
+                return
+            self._schedule_index_backoff = 60.0
+            self.schedule_index.load(settings_by_user)
+            self.schedule_index_loaded_at = time.monotonic()
+            self._schedule_synced_since = synced_since
+            self._schedule_synced_at = time.monotonic()
+            logger.info(f"Schedule index loaded for {len(self.schedule_index)} users.")
+
+    async def get_scheduled_snapshots(self, kind, now_utc, user_ids=None):
+        if user_ids is not None:
+            snapshots = await self.firebase.get_user_snapshots(list(user_ids))
+            return [s for s in snapshots if s.reminder_settings.get(f'{kind}_time_utc') == now_utc]
+        await self.ensure_schedule_index()
+        if not self.schedule_index.loaded:
+            snapshots = await self.firebase.get_user_snapshots_with_time(kind, now_utc)
+            return [snapshot for snapshot in snapshots if self.shards.owns(snapshot.user_id)]
+        user_ids = [u for u in self.schedule_index.users_at(kind, now_utc) if self.shards.owns(u)]
+        if not user_ids:
+            return []
+        due = []
+        for snapshot in await self.firebase.get_user_snapshots(user_ids):
+            settings = snapshot.reminder_settings
+            if settings.get(f'{kind}_time_utc') == now_utc:
+                due.append(snapshot)
+            elif settings:
+                self.schedule_index.update(snapshot.user_id, settings)
+            else:
+                self.schedule_index.remove(snapshot.user_id)
+        return due
+
+    async def deliver_scheduled(self, context, deliveries, job_name):
+        # State changes are persisted before this is called, so nothing a
+        # user does after reading a message can be overwritten by its job.
+        report = await self.delivery.deliver(context.bot, deliveries, job_name=job_name)
+        metrics.MESSAGES_SENT.labels(job_name).inc(report.sent)
+        for error, count in report.errors.items():
+            metrics.SEND_ERRORS.labels(job_name, error).inc(count)
+        counts = self.tick_counts[job_name.lower()]
+        counts.update(sent=report.sent, failed=report.failed, retries=report.retries)
+        counts.update({f"error_{name}": count for name, count in report.errors.items()})
+        counts['send_seconds'] += report.elapsed
+        return report
+
+    async def run_scheduled_minutes(self, kind, context, process_minute):
+        if kind in self._running_jobs:
+            logger.info(f"{kind.capitalize()} check is already running, skipping...")
+            return
+        self._running_jobs.add(kind)
         try:
-            now_utc = datetime.utcnow().strftime("%H:%M")
-            user_ids = self.firebase.get_users_with_reminder_time(now_utc)
-            for user_id in user_ids:
+            if not await self.shards.ensure_lease():
+                return
+            cursor = self.cursors.get(kind)
+            if cursor is None:
+                stored = await self.firebase.get_scheduler_cursor(self.shards.scoped(kind))
+                if stored is None:
+                    return
+                cursor = MinuteCursor(
+                    MinuteCursor.parse(stored),
+                    max_catchup=int(os.getenv('SCHEDULER_MAX_CATCHUP_MINUTES', '180')),
+                    max_per_tick=int(os.getenv('SCHEDULER_MINUTES_PER_TICK', '15')),
+                )
+                self.cursors[kind] = cursor
+            processed_users = 0
+            tick_started = time.monotonic()
+            self.tick_counts.pop(kind, None)
+            for minute, user_ids in sorted(self.retry_users.pop(kind, {}).items()):
+                if datetime.utcnow() - minute >= timedelta(minutes=cursor.max_catchup):
+                    logger.error(f"Giving up {kind} retries for {minute:%H:%M} UTC: {sorted(user_ids, key=str)}")
+                    continue
+                try:
+                    processed_users += await process_minute(context, minute, user_ids)
+                except Exception as e:
+                    logger.error(f"Error retrying {kind} scheduler for {minute:%H:%M} UTC: {e}", exc_info=True)
+                    self.retry_users[kind].setdefault(minute, set()).update(user_ids)
+            for minute in cursor.due_minutes(datetime.utcnow()):
                 try:
-                    last_reminder_sent_date = self.firebase.get_last_reminder_sent_date(user_id)
-                    today_date = datetime.utcnow().strftime("%Y-%m-%d")
-                    if last_reminder_sent_date == today_date:
-                        logger.info(f"Reminder already sent today to user {user_id}, skipping.")
-                        continue
-                    question = self.current_questions.get(user_id)
-                    if not question:
-                        logger.info(f"No active question found for user {user_id}, skipping reminder.")
-                        continue
-                    try:
-                        bot = context.bot
-                        await bot.send_message(
-                            user_id,
-                            "Friendly reminder! Complete today's DSA question! Use /done or /missed to mark your progress.",
-                        )
-                        self.firebase.update_last_reminder_sent_date(user_id, today_date)
-                        logger.info(f"Completion reminder sent to user {user_id} at {now_utc} UTC.")
-                    except Exception as e:
-                        logger.error(f"Error sending reminder to user {user_id}: {e}")
+                    processed_users += await process_minute(context, minute)
+                    self.tick_counts[kind]['minutes'] += 1
                 except Exception as e:
-                    logger.error(f"Error in reminder scheduler for user {user_id}: {e}")
+                    # Leave the cursor here so the minute is retried next tick.
+                    logger.error(f"Error in {kind} scheduler for {minute:%H:%M} UTC: {e}", exc_info=True)
+                    break
+                cursor.advance(minute)
+            elapsed = time.monotonic() - tick_started
+            metrics.SCHEDULER_TICK_SECONDS.labels(kind).observe(elapsed)
+            metrics.SCHEDULER_USERS.labels(kind).inc(processed_users)
+            counts = self.tick_counts.pop(kind, Counter())
+            if processed_users:
+                counts['users'] = processed_users
+                send_seconds = counts.pop('send_seconds', 0)
+                rate = counts['sent'] / send_seconds if send_seconds else 0.0
+                logger.info(
+                    f"{kind.capitalize()} tick: " + " ".join(f"{name}={count}" for name, count in sorted(counts.items()))
+                    + f" in {elapsed:.2f}s ({rate:.1f} msg/s)",
+                    extra={'tick': kind, 'counts': dict(counts), 'elapsed': round(elapsed, 3), 'msg_per_s': round(rate, 1)},
+                )
+            persisted = self._cursor_persisted_at.get(kind, 0.0)
+            if processed_users or time.monotonic() - persisted >= 300:
+                await self.firebase.set_scheduler_cursor(self.shards.scoped(kind), cursor.serialize())
+                self._cursor_persisted_at[kind] = time.monotonic()
         finally:
-            self.is_reminder_running = False
+            self._running_jobs.discard(kind)
+
+    async def check_and_send_practice_questions(self, context):
+        await self.run_scheduled_minutes('practice', context, self.send_practice_questions)
+
+    async def check_and_send_reminders(self, context):
+        await self.run_scheduled_minutes('reminder', context, self.send_reminders)
 
     async def check_and_auto_mark_missed(self, context):
-        if self.is_deadline_check_running:
-            logger.info("Deadline check is already running, skipping...")
-            return
-        self.is_deadline_check_running = True
+        await self.run_scheduled_minutes('deadline', context, self.auto_mark_missed)
+
+    def local_date(self, snapshot, minute):
+        return local_date(snapshot.reminder_settings, minute)
+
+    async def claim_deliveries(self, kind, minute, snapshots):
+        async def claim(snapshot):
+            date_str = self.local_date(snapshot, minute)
+            claimed = await self.delivery_ledger.claim(snapshot.user_id, kind, date_str)
+            if claimed:
+                return snapshot
+            if claimed is None:
+                # Storage didn't answer; try again next tick instead of
+                # skipping the user for the day.
+                self.retry_users[kind].setdefault(minute, set()).add(snapshot.user_id)
+                self.tick_counts[kind]['claim_retry'] += 1
+            else:
+                self.tick_counts[kind]['already_handled'] += 1
+            return None
+
+        return [snapshot for snapshot in await asyncio.gather(*(claim(s) for s in snapshots)) if snapshot]
+
+    async def release_claim(self, kind, minute, snapshot):
+        # The claim is given back and the user retried next tick, so a failed
+        # write doesn't leave today's job silently undone.
+        self.retry_users[kind].setdefault(minute, set()).add(snapshot.user_id)
+        self.tick_counts[kind]['retry_queued'] += 1
+        await self.delivery_ledger.release(snapshot.user_id, kind, self.local_date(snapshot, minute))
+
+    async def send_practice_questions(self, context, minute, user_ids=None):
+        now_utc = minute.strftime("%H:%M")
+        snapshots = await self.get_scheduled_snapshots('practice', now_utc, user_ids)
+        if not snapshots:
+            return 0
+
+        async def prepare(snapshot):
+            user_id = snapshot.user_id
+            try:
+                question, error_message = await self.question_matcher.pick_question(user_id, snapshot.preferences)
+                if error_message:
+                    self.tick_counts['practice']['no_question'] += 1
+                    return None
+                return user_id, question
+            except Exception as e:
+                logger.error(f"Error in practice question scheduler for user {user_id}: {e}")
+                await self.release_claim('practice', minute, snapshot)
+                return None
+
+        claimed = {s.user_id: s for s in await self.claim_deliveries('practice', minute, snapshots)}
+        assigned = dict(a for a in await asyncio.gather(*(prepare(s) for s in claimed.values())) if a)
+        # The assignment is durable before the question goes out, so a /done
+        # sent after reading it always lands after these writes.
+        batch = self.firebase.new_write_batch()
+        for user_id, question in assigned.items():
+            self.active_questions.forget(user_id)
+            batch.queue_active_question(user_id, question)
+            batch.queue_question_status(user_id, question, "pending")
+        failed_users = await self.flush_scheduler_writes(batch, "Practice")
+        await asyncio.gather(*(self.release_claim('practice', minute, claimed[user_id]) for user_id in failed_users))
+        deliveries = []
+        for user_id, question in assigned.items():
+            if user_id in failed_users:
+                continue
+            self.active_questions.remember(user_id, question)
+            deliveries.append(Delivery(
+                user_id,
+                f"It's practice time!\nQuestion: {question['Question']}\nDifficulty: {question['Difficulty']}\nUse /done or /missed to mark your progress.",
+            ))
+        report = await self.deliver_scheduled(context, deliveries, "Practice")
+        # Withdraw questions that never reached the user, unless they have
+        # already moved on from them.
+        await asyncio.gather(*(self.withdraw_question(user_id, assigned[user_id]) for user_id in report.failed_chats))
+        return len(snapshots)
+
+    async def withdraw_question(self, user_id, question):
         try:
-            now_utc = datetime.utcnow().strftime("%H:%M")
-            user_ids = self.firebase.get_users_with_deadline_time(now_utc)
-            for user_id in user_ids:
-                try:
-                    last_deadline_processed_date = self.firebase.get_last_deadline_processed_date(user_id)
-                    today_date = datetime.utcnow().strftime("%Y-%m-%d")
-                    if last_deadline_processed_date == today_date:
-                        logger.info(f"Deadline already processed today for user {user_id}, skipping.")
-                        continue
-                    question = self.current_questions.pop(user_id, None)
-                    if not question:
-                        logger.info(f"No active question found for user {user_id}, skipping auto-marking.")
-                        continue
-                    try:
-                        self.firebase.update_question_status(user_id, question['Question'], "missed")
-                        logger.info(f"Question auto-marked as missed for user {user_id} at {now_utc} UTC.")
-                        bot = context.bot
-                        await bot.send_message(
-                            user_id,
-                            f"The deadline for today's question ({question['Question']}) has passed. It has been marked as missed.",
-                        )
-                        self.firebase.update_last_deadline_processed_date(user_id, today_date)
-                    except Exception as e:
-                        logger.error(f"Error auto-marking question as missed for user {user_id}: {e}")
-                except Exception as e:
-                    logger.error(f"Error in deadline scheduler for user {user_id}: {e}")
-        finally:
-            self.is_deadline_check_running = False
\ No newline at end of file
+            await self.active_questions.resolve(user_id, None, question=question)
+        except Exception as e:
+            logger.error(f"Error withdrawing undelivered question for user {user_id}: {e}")
+
+    async def send_reminders(self, context, minute, user_ids=None):
+        now_utc = minute.strftime("%H:%M")
+        snapshots = await self.get_scheduled_snapshots('reminder', now_utc, user_ids)
+        if not snapshots:
+            return 0
+        pending = []
+        for snapshot in snapshots:
+            if not snapshot.active_question:
+                self.tick_counts['reminder']['no_active_question'] += 1
+                continue
+            pending.append(snapshot)
+        deliveries = [
+            Delivery(
+                snapshot.user_id,
+                "Friendly reminder! Complete today's DSA question! Use /done or /missed to mark your progress.",
+            )
+            for snapshot in await self.claim_deliveries('reminder', minute, pending)
+        ]
+        await self.deliver_scheduled(context, deliveries, "Reminder")
+        return len(snapshots)
+
+    async def auto_mark_missed(self, context, minute, user_ids=None):
+        now_utc = minute.strftime("%H:%M")
+        snapshots = await self.get_scheduled_snapshots('deadline', now_utc, user_ids)
+        if not snapshots:
+            return 0
+        pending = []
+        for snapshot in snapshots:
+            if not snapshot.active_question:
+                self.tick_counts['deadline']['no_active_question'] += 1
+                continue
+            pending.append(snapshot)
+
+        async def expire(snapshot):
+            # Only the question read in the snapshot is expired; if the user
+            # resolved it or took a new one since, storage leaves it alone.
+            user_id = snapshot.user_id
+            try:
+                question = await self.active_questions.resolve(
+                    user_id, "missed", self.local_date(snapshot, minute), snapshot.active_question
+                )
+            except Exception as e:
+                logger.error(f"Error auto-marking question as missed for user {user_id}: {e}")
+                await self.release_claim('deadline', minute, snapshot)
+                return None
+            if not question:
+                self.tick_counts['deadline']['already_resolved'] += 1
+                return None
+            self.tick_counts['deadline']['auto_missed'] += 1
+            return Delivery(
+                user_id,
+                f"The deadline for today's question ({question['Question']}) has passed. It has been marked as missed.",
+            )
+
+        claimed = await self.claim_deliveries('deadline', minute, pending)
+        deliveries = [d for d in await asyncio.gather(*(expire(s) for s in claimed)) if d]
+        await self.deliver_scheduled(context, deliveries, "Deadline")
+        return len(snapshots)
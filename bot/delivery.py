@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+def _seconds(value):
+    return value.total_seconds() if hasattr(value, 'total_seconds') else float(value)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class Delivery:
+    __slots__ = ('chat_id', 'text', 'kwargs')
+
+    def __init__(self, chat_id, text, **kwargs):
+        self.chat_id = chat_id
+        self.text = text
+        self.kwargs = kwargs
+
+
+class DeliveryReport:
+    def __init__(self, job_name):
+        self.job_name = job_name
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.errors = Counter()
+        self.failed_chats = []
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+
+class DeliveryLedger:
+    # Exactly one claim per (user, kind, local date). The durable claim is a
+    # create-if-absent write; the in-memory set answers repeats locally.
+    def __init__(self, firebase_manager, days_kept=2):
+        self.firebase = firebase_manager
+        self.days_kept = days_kept
+        self._claimed = {}
+
+    def seen(self, user_id, kind, date_str):
+        return (user_id, kind) in self._claimed.get(date_str, ())
+
+    def _remember(self, user_id, kind, date_str):
+        if date_str not in self._claimed:
+            self._claimed[date_str] = set()
+            for old_date in sorted(self._claimed)[:-self.days_kept]:
+                del self._claimed[old_date]
+        self._claimed.get(date_str, set()).add((user_id, kind))
+
+    async def claim(self, user_id, kind, date_str):
+        if self.seen(user_id, kind, date_str):
+            return False
+        claimed = await self.firebase.claim_delivery(user_id, kind, date_str)
+        if claimed is None:
+            # Unknown outcome: not remembered, so a retry asks storage again
+            # and a claim that did land comes back as taken.
+            return None
+        self._remember(user_id, kind, date_str)
+        return claimed
+
+    async def release(self, user_id, kind, date_str):
+        # For claims whose side effects failed to persist, so a retry can
+        # claim them again.
+        self._claimed.get(date_str, set()).discard((user_id, kind))
+        return await self.firebase.release_delivery(user_id, kind, date_str)
+
+
+class DeliveryEngine:
+    # Telegram allows roughly 30 messages/s per bot and 1 message/s per chat.
+    def __init__(self, max_concurrency=None, global_rate=None, per_chat_interval=1.0, max_retries=3):
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv('TELEGRAM_MAX_CONCURRENCY', '20'))
+        if global_rate is None:
+            global_rate = float(os.getenv('TELEGRAM_GLOBAL_RATE', '25'))
+        self.max_concurrency = max_concurrency
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self._chat_next_send = {}
+
+    async def _wait_for_chat(self, chat_id):
+        now = time.monotonic()
+        next_send = self._chat_next_send.get(chat_id, 0.0)
+        self._chat_next_send[chat_id] = max(now, next_send) + self.per_chat_interval
+        if next_send > now:
+            await asyncio.sleep(next_send - now)
+
+    def _forget_idle_chats(self):
+        now = time.monotonic()
+        for chat_id in [c for c, t in self._chat_next_send.items() if t < now]:
+            del self._chat_next_send[chat_id]
+
+    async def _send(self, bot, delivery, report):
+        attempt = 0
+        while True:
+            await self._wait_for_chat(delivery.chat_id)
+            await self.global_bucket.acquire()
+            try:
+                await bot.send_message(delivery.chat_id, delivery.text, **delivery.kwargs)
+            except RetryAfter as e:
+                # Flood control applies to the whole bot, so hold every sender.
+                wait = _seconds(e.retry_after)
+                self.global_bucket.pause(wait)
+                report.errors['RetryAfter'] += 1
+                attempt += 1
+                if attempt > self.max_retries:
+                    logger.error(f"Giving up sending to {delivery.chat_id} after {attempt} attempts: {e}")
+                    break
+                report.retries += 1
+            except (BadRequest, Forbidden) as e:
+                report.errors[type(e).__name__] += 1
+                logger.error(f"Permanent error sending to {delivery.chat_id}: {e}")
+                break
+            except NetworkError as e:
+                report.errors[type(e).__name__] += 1
+                attempt += 1
+                if attempt > self.max_retries:
+                    logger.error(f"Giving up sending to {delivery.chat_id} after {attempt} attempts: {e}")
+                    break
+                report.retries += 1
+                await asyncio.sleep(min(2 ** attempt * 0.5, 10))
+            except Exception as e:
+                report.errors[type(e).__name__] += 1
+                logger.error(f"Error sending to {delivery.chat_id}: {e}")
+                break
+            else:
+                report.sent += 1
+                return True
+        report.failed += 1
+        report.failed_chats.append(delivery.chat_id)
+        return False
+
+    async def deliver(self, bot, deliveries, job_name="delivery"):
+        report = DeliveryReport(job_name)
+        if deliveries:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            async def worker(delivery):
+                async with semaphore:
+                    await self._send(bot, delivery, report)
+
+            await asyncio.gather(*(worker(delivery) for delivery in deliveries))
+            self._forget_idle_chats()
+        report.elapsed = time.monotonic() - report.started
+        return report
@@ -0,0 +1,132 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+# LogRecord attributes that are not user-supplied `extra` fields.
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    # One JSON object per line; anything passed through `extra=` is kept as a field.
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    # Lets through `burst` routine (below WARNING) records per call site
+    # every `window` seconds and drops the rest; the next record let through
+    # carries the dropped count. Warnings and errors always pass.
+    def __init__(self, burst=20, window=60.0):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            started, seen, dropped = self._sites.get(key, (now, 0, 0))
+            if now - started >= self.window:
+                started, seen = now, 0
+            if seen >= self.burst:
+                self._sites[key] = (started, seen, dropped + 1)
+                return False
+            self._sites[key] = (started, seen + 1, 0)
+        if dropped:
+            record.suppressed = dropped
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    # Keeps the message and traceback separate so the listener's formatter,
+    # not this one, decides the output format.
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _formatter(fmt):
+    if fmt == 'json':
+        return JsonFormatter()
+    return logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+
+def configure_logging():
+    # Handlers writing to disk or the console run on a background thread;
+    # callers on the event loop only put records on a queue.
+    global _listener
+    if _listener is not None:
+        return _listener
+    level = os.getenv('LOG_LEVEL', 'INFO').upper()
+    handlers = []
+    log_file = os.getenv('LOG_FILE', 'dsa_bot.log')
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file,
+            maxBytes=int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+            backupCount=int(os.getenv('LOG_BACKUP_COUNT', '5')),
+            encoding='utf-8',
+        )
+        file_handler.setFormatter(_formatter(os.getenv('LOG_FORMAT', 'json')))
+        handlers.append(file_handler)
+    console = logging.StreamHandler()
+    console.setFormatter(_formatter(os.getenv('LOG_CONSOLE_FORMAT', 'text')))
+    handlers.append(console)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    burst = int(os.getenv('LOG_SAMPLE_BURST', '20'))
+    if burst > 0:
+        queue_handler.addFilter(SamplingFilter(burst, float(os.getenv('LOG_SAMPLE_WINDOW', '60'))))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    # httpx logs every Bot API request at INFO.
+    logging.getLogger('httpx').setLevel(os.getenv('HTTPX_LOG_LEVEL', 'WARNING').upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    # Flushes whatever is still queued.
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
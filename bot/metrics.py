@@ -0,0 +1,124 @@
+import asyncio
+import functools
+import logging
+import os
+import time
+
+import dotenv
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Metrics are only collected when METRICS_PORT is set and prometheus_client
+# is installed; otherwise every metric below is a shared no-op object.
+METRICS_PORT = os.getenv('METRICS_PORT')
+ENABLED = bool(METRICS_PORT) and prometheus_client is not None
+
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+TICK_BUCKETS = (.01, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class _NoopMetric:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def set_function(self, func):
+        pass
+
+
+NOOP = _NoopMetric()
+
+
+def _metric(kind, name, documentation, labels=(), **kwargs):
+    if not ENABLED:
+        return NOOP
+    return getattr(prometheus_client, kind)(name, documentation, labels, **kwargs)
+
+
+HANDLER_LATENCY = _metric(
+    'Histogram', 'dsa_handler_latency_seconds', 'Telegram update handler latency', ['handler'], buckets=LATENCY_BUCKETS
+)
+STORAGE_LATENCY = _metric(
+    'Histogram', 'dsa_storage_call_seconds', 'Storage call latency by method', ['method'], buckets=LATENCY_BUCKETS
+)
+STORAGE_ERRORS = _metric('Counter', 'dsa_storage_errors_total', 'Storage calls that raised', ['method'])
+SHEET_FETCH_SECONDS = _metric(
+    'Histogram', 'dsa_catalog_fetch_seconds', 'Catalog source revision check and fetch duration', buckets=TICK_BUCKETS
+)
+CATALOG_QUESTIONS = _metric('Gauge', 'dsa_catalog_questions', 'Questions in the loaded catalog')
+PROFILE_CACHE_HITS = _metric('Gauge', 'dsa_profile_cache_hits', 'Profile cache hits since start')
+PROFILE_CACHE_MISSES = _metric('Gauge', 'dsa_profile_cache_misses', 'Profile cache misses since start')
+PROFILE_CACHE_HIT_RATIO = _metric('Gauge', 'dsa_profile_cache_hit_ratio', 'Profile cache hits / lookups')
+SCHEDULER_TICK_SECONDS = _metric(
+    'Histogram', 'dsa_scheduler_tick_seconds', 'Scheduler tick duration', ['kind'], buckets=TICK_BUCKETS
+)
+SCHEDULER_USERS = _metric('Counter', 'dsa_scheduler_users_total', 'Users processed by scheduler ticks', ['kind'])
+MESSAGES_SENT = _metric('Counter', 'dsa_messages_sent_total', 'Scheduled messages delivered', ['job'])
+SEND_ERRORS = _metric('Counter', 'dsa_send_errors_total', 'Scheduled send errors by type', ['job', 'error'])
+LOOP_LAG = _metric(
+    'Histogram', 'dsa_event_loop_lag_seconds', 'Event loop scheduling delay', buckets=LATENCY_BUCKETS
+)
+
+
+def start_server():
+    if not ENABLED:
+        return False
+    prometheus_client.start_http_server(int(METRICS_PORT), addr=os.getenv('METRICS_ADDR', '127.0.0.1'))
+    logger.info(f"Metrics served on {os.getenv('METRICS_ADDR', '127.0.0.1')}:{METRICS_PORT}/metrics")
+    return True
+
+
+def timed_handler(callback):
+    if not ENABLED:
+        return callback
+    histogram = HANDLER_LATENCY.labels(callback.__name__)
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            histogram.observe(time.perf_counter() - started)
+
+    return wrapper
+
+
+def watch_profile_cache(cache):
+    PROFILE_CACHE_HITS.set_function(lambda: cache.hits)
+    PROFILE_CACHE_MISSES.set_function(lambda: cache.misses)
+    PROFILE_CACHE_HIT_RATIO.set_function(lambda: cache.hits / (cache.hits + cache.misses) if cache.hits + cache.misses else 0.0)
+
+
+_lag_task = None
+
+
+async def _sample_loop_lag(interval):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0.0, loop.time() - started - interval))
+
+
+async def start_loop_lag_monitor(context=None, interval=0.5):
+    # Runs from a one-shot job so it starts on the bot's own loop, whether
+    # the worker polls or only runs jobs.
+    global _lag_task
+    if ENABLED and _lag_task is None:
+        _lag_task = asyncio.ensure_future(_sample_loop_lag(interval))
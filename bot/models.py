@@ -1,21 +1,43 @@
 import firebase_admin
 from firebase_admin import credentials, firestore
 import gspread
+from gspread.urls import DRIVE_FILES_API_V3_URL
 from google.oauth2.service_account import Credentials
+from google.api_core.exceptions import AlreadyExists
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import os
 import json
 import pytz
 import dotenv
 import random
+import asyncio
+import functools
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .catalog import (
+    DEFAULT_SNAPSHOT_PATH, CatalogDiff, ProfileCache, QuestionCatalog, QuestionSampler, as_question_dict,
+    load_snapshot, parse_weights, question_id_for, save_snapshot,
+)
+from . import metrics
+from .scheduling import local_date
+from .sources import CatalogSource, MemoryCatalogSource, SQLiteCatalogSource
+from .storage import (
+    PROGRESS_STATUSES, STATS_STATUSES, MemoryStorage, SQLiteStorage, Storage, UserSnapshot, history_entry,
+    next_streak, reset_streak_data, stats_counter_paths,
+)
 
 dotenv.load_dotenv()
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class FirebaseManager:
+# Lower bound for users.last_updated timestamps.
+SETTINGS_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class FirebaseManager(Storage):
     _instance = None
     _initialized = False
 
@@ -71,7 +93,8 @@ class FirebaseManager:
             user_ref = self.db.collection('users').document(str(user_id))
             user_ref.set({
                 'reminder_settings': settings,
-                'last_updated': datetime.now().isoformat()
+                # Server-assigned, so every worker's sync cursor uses one clock.
+                'last_updated': firestore.SERVER_TIMESTAMP
             }, merge=True)
             return True
         except Exception as e:
@@ -87,108 +110,160 @@ class FirebaseManager:
             logger.error(f"Error getting reminder settings: {e}")
             return {}
 
-    def get_users_with_practice_time(self, utc_time_str):
+    def get_user_snapshot(self, user_id):
         try:
-            users_ref = self.db.collection('users')
-            query = users_ref.where('reminder_settings.practice_time_utc', '==', utc_time_str)
-            docs = query.stream()
-            return [doc.id for doc in docs]
+            user_ref = self.db.collection('users').document(str(user_id))
+            return UserSnapshot.from_document(user_ref.get())
         except Exception as e:
-            logger.error(f"Error getting users for practice time {utc_time_str}: {e}")
-            return []
+            logger.error(f"Error getting user snapshot for user {user_id}: {e}")
+            return UserSnapshot(user_id)
 
-    def get_users_with_reminder_time(self, utc_time_str):
+    def get_user_snapshots_with_time(self, kind, utc_time_str):
         try:
             users_ref = self.db.collection('users')
-            query = users_ref.where('reminder_settings.reminder_time_utc', '==', utc_time_str)
-            docs = query.stream()
-            return [doc.id for doc in docs]
+            query = users_ref.where(f'reminder_settings.{kind}_time_utc', '==', utc_time_str)
+            return [UserSnapshot.from_document(doc) for doc in query.stream()]
         except Exception as e:
-            logger.error(f"Error getting users for reminder time {utc_time_str}: {e}")
+            logger.error(f"Error getting users for {kind} time {utc_time_str}: {e}")
             return []
 
-    def get_users_with_deadline_time(self, utc_time_str):
+    def get_user_snapshots(self, user_ids, chunk_size=300):
+        snapshots = []
+        user_ids = list(user_ids)
+        users_ref = self.db.collection('users')
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            try:
+                refs = [users_ref.document(str(user_id)) for user_id in chunk]
+                snapshots.extend(UserSnapshot.from_document(doc) for doc in self.db.get_all(refs))
+            except Exception as e:
+                logger.error(f"Error getting user snapshots for {len(chunk)} users: {e}")
+        return snapshots
+
+    def get_all_reminder_settings(self):
         try:
-            users_ref = self.db.collection('users')
-            query = users_ref.where('reminder_settings.deadline_time_utc', '==', utc_time_str)
-            docs = query.stream()
-            return [doc.id for doc in docs]
+            docs = self.db.collection('users').select(['reminder_settings']).stream()
+            settings_by_user = {}
+            for doc in docs:
+                settings = (doc.to_dict() or {}).get('reminder_settings')
+                if settings:
+                    settings_by_user[UserSnapshot(doc.id).user_id] = settings
+            return settings_by_user
         except Exception as e:
-            logger.error(f"Error getting users for deadline time {utc_time_str}: {e}")
-            return []
+            logger.error(f"Error loading reminder settings for all users: {e}")
+            return None
 
-    def get_last_question_sent_date(self, user_id):
+    def get_scheduler_cursor(self, name):
         try:
-            user_ref = self.db.collection('users').document(str(user_id))
-            doc = user_ref.get()
-            if doc.exists:
-                data = doc.to_dict()
-                return data.get('last_question_sent_date', '')
-            return ''
+            doc = self.db.collection('scheduler_state').document(name).get()
+            return doc.to_dict().get('last_processed_minute', '') if doc.exists else ''
         except Exception as e:
-            logger.error(f"Error getting last question sent date for user {user_id}: {e}")
-            return ''
+            logger.error(f"Error getting scheduler cursor {name}: {e}")
+            return None
 
-    def update_last_question_sent_date(self, user_id, date_str):
+    def set_scheduler_cursor(self, name, minute_str):
         try:
-            user_ref = self.db.collection('users').document(str(user_id))
-            user_ref.set({
-                'last_question_sent_date': date_str,
-                'last_question_sent_timestamp': datetime.now().isoformat()
+            self.db.collection('scheduler_state').document(name).set({
+                'last_processed_minute': minute_str,
+                'updated_at': datetime.now().isoformat()
             }, merge=True)
             return True
         except Exception as e:
-            logger.error(f"Error updating last question sent date for user {user_id}: {e}")
+            logger.error(f"Error saving scheduler cursor {name}: {e}")
             return False
 
-    def get_last_reminder_sent_date(self, user_id):
+    def get_latest_settings_update(self):
+        # Older documents hold ISO strings, which Firestore orders apart from
+        # timestamps; the range filter keeps them out.
         try:
-            user_ref = self.db.collection('users').document(str(user_id))
-            doc = user_ref.get()
-            if doc.exists:
-                data = doc.to_dict()
-                return data.get('last_reminder_sent_date', '')
-            return ''
+            query = (
+                self.db.collection('users')
+                .where('last_updated', '>=', SETTINGS_EPOCH)
+                .order_by('last_updated', direction=firestore.Query.DESCENDING)
+                .limit(1)
+            )
+            for doc in query.select(['last_updated']).stream():
+                return (doc.to_dict() or {}).get('last_updated')
+            return None
         except Exception as e:
-            logger.error(f"Error getting last reminder sent date for user {user_id}: {e}")
-            return ''
+            logger.error(f"Error getting latest reminder settings update: {e}")
+            return None
 
-    def update_last_reminder_sent_date(self, user_id, date_str):
+    def get_reminder_settings_updated_since(self, since):
+        # Returns the changed settings and the newest last_updated among them,
+        # which is the cursor for the next call.
         try:
-            user_ref = self.db.collection('users').document(str(user_id))
-            user_ref.set({
-                'last_reminder_sent_date': date_str,
-                'last_reminder_sent_timestamp': datetime.now().isoformat()
-            }, merge=True)
-            return True
+            query = self.db.collection('users').where('last_updated', '>', since or SETTINGS_EPOCH)
+            settings_by_user = {}
+            newest = since
+            for doc in query.select(['reminder_settings', 'last_updated']).stream():
+                data = doc.to_dict() or {}
+                settings_by_user[UserSnapshot(doc.id).user_id] = data.get('reminder_settings', {})
+                if newest is None or data['last_updated'] > newest:
+                    newest = data['last_updated']
+            return settings_by_user, newest
         except Exception as e:
-            logger.error(f"Error updating last reminder sent date for user {user_id}: {e}")
+            logger.error(f"Error loading reminder settings updated since {since}: {e}")
+            return {}, since
+
+    def try_acquire_lease(self, name, owner, ttl_seconds):
+        try:
+            lease_ref = self.db.collection('scheduler_leases').document(name)
+
+            @firestore.transactional
+            def claim(transaction):
+                doc = lease_ref.get(transaction=transaction)
+                now = datetime.utcnow()
+                if doc.exists:
+                    data = doc.to_dict()
+                    if data.get('owner') != owner and data.get('expires_at', '') > now.isoformat():
+                        return False
+                transaction.set(lease_ref, {
+                    'owner': owner,
+                    'expires_at': (now + timedelta(seconds=ttl_seconds)).isoformat(),
+                    'renewed_at': now.isoformat()
+                })
+                return True
+
+            return claim(self.db.transaction())
+        except Exception as e:
+            logger.error(f"Error acquiring lease {name}: {e}")
             return False
 
-    def get_last_deadline_processed_date(self, user_id):
+    def claim_delivery(self, user_id, kind, date_str):
         try:
-            user_ref = self.db.collection('users').document(str(user_id))
-            doc = user_ref.get()
-            if doc.exists:
-                data = doc.to_dict()
-                return data.get('last_deadline_processed_date', '')
-            return ''
+            ledger_ref = self.db.collection('delivery_ledger').document(f"{user_id}_{kind}_{date_str}")
+            ledger_ref.create({
+                'user_id': str(user_id),
+                'kind': kind,
+                'date': date_str,
+                'claimed_at': datetime.now().isoformat(),
+                'expires_at': datetime.utcnow() + timedelta(days=7)
+            })
+            return True
+        except AlreadyExists:
+            return False
         except Exception as e:
-            logger.error(f"Error getting last deadline processed date for user {user_id}: {e}")
-            return ''
+            logger.error(f"Error claiming {kind} delivery for user {user_id} on {date_str}: {e}")
+            return None
 
-    def update_last_deadline_processed_date(self, user_id, date_str):
+    def release_delivery(self, user_id, kind, date_str):
         try:
-            user_ref = self.db.collection('users').document(str(user_id))
-            user_ref.set({
-                'last_deadline_processed_date': date_str,
-                'last_deadline_processed_timestamp': datetime.now().isoformat()
-            }, merge=True)
+            self.db.collection('delivery_ledger').document(f"{user_id}_{kind}_{date_str}").delete()
             return True
         except Exception as e:
-            logger.error(f"Error updating last deadline processed date for user {user_id}: {e}")
+            logger.error(f"Error releasing {kind} delivery for user {user_id} on {date_str}: {e}")
             return False
 
+    def get_users_with_practice_time(self, utc_time_str):
+        return [snapshot.user_id for snapshot in self.get_user_snapshots_with_time('practice', utc_time_str)]
+
+    def get_users_with_reminder_time(self, utc_time_str):
+        return [snapshot.user_id for snapshot in self.get_user_snapshots_with_time('reminder', utc_time_str)]
+
+    def get_users_with_deadline_time(self, utc_time_str):
+        return [snapshot.user_id for snapshot in self.get_user_snapshots_with_time('deadline', utc_time_str)]
+
     def get_user_data(self, user_id):
         try:
             user_ref = self.db.collection('users').document(str(user_id))
@@ -200,6 +275,28 @@ class FirebaseManager:
             logger.error(f"Error getting user data for user {user_id}: {e}")
             return {}
 
+    def _active_question_data(self, question):
+        if not question:
+            return {'active_question': firestore.DELETE_FIELD}
+        return {'active_question': dict(as_question_dict(question), assigned_at=datetime.now().isoformat())}
+
+    def get_active_question(self, user_id):
+        try:
+            doc = self.db.collection('users').document(str(user_id)).get()
+            return (doc.to_dict().get('active_question') or None) if doc.exists else None
+        except Exception as e:
+            logger.error(f"Error getting active question for user {user_id}: {e}")
+            raise
+
+    def set_active_question(self, user_id, question):
+        try:
+            user_ref = self.db.collection('users').document(str(user_id))
+            user_ref.set(self._active_question_data(question), merge=True)
+            return True
+        except Exception as e:
+            logger.error(f"Error setting active question for user {user_id}: {e}")
+            return False
+
     def get_user_tracking(self, user_id):
         try:
             tracking_ref = self.db.collection('user_tracking').document(str(user_id))
@@ -211,69 +308,177 @@ class FirebaseManager:
             logger.error(f"Error getting user tracking for {user_id}: {e}")
             return {}
 
-    def update_question_status(self, user_id, question_title, status):
+    def _progress_ref(self, user_id):
+        return self.db.collection('user_progress').document(str(user_id))
+
+    def _stats_ref(self, user_id):
+        return self.db.collection('user_stats').document(str(user_id))
+
+    def _stats_data(self, question, status, date_str):
+        # Counters live in one user_stats/{id} doc so /stats is a single get.
+        data = {'updated_at': datetime.now().isoformat()}
+        for path in stats_counter_paths(question, status, date_str):
+            node = data
+            for key in path[:-1]:
+                node = node.setdefault(key, {})
+            node[path[-1]] = firestore.Increment(1)
+        return data
+
+    def _question_status_writes(self, user_id, question, status, date_str=None):
+        # user_progress/{id} holds one small array of catalog ids per status;
+        # timestamps go to an append-only history subcollection instead.
+        qid = question_id_for(question)
+        progress_ref = self._progress_ref(user_id)
+        progress = {other: firestore.ArrayRemove([qid]) for other in PROGRESS_STATUSES if other != status}
+        progress[status] = firestore.ArrayUnion([qid])
+        progress['updated_at'] = datetime.now().isoformat()
+        writes = [(progress_ref, progress), (progress_ref.collection('history').document(), history_entry(question, status))]
+        if status in STATS_STATUSES:
+            if date_str is None:
+                date_str = local_date(self.get_user_reminder_settings(user_id))
+            writes.append((self._stats_ref(user_id), self._stats_data(question, status, date_str)))
+        if status == 'missed':
+            writes.append((self.db.collection('users').document(str(user_id)), reset_streak_data(date_str)))
+        return writes
+
+    def update_question_status(self, user_id, question, status, date_str=None):
         try:
-            tracking_ref = self.db.collection('user_tracking').document(str(user_id))
-            safe_title = question_title.replace('.', '_').replace('/', '_')[:100]
-            update_data = {
-                safe_title: {
-                    'status': status,
-                    'timestamp': datetime.now().isoformat(),
-                    'original_title': question_title
-                }
-            }
-            tracking_ref.set(update_data, merge=True)
+            if status == 'done':
+                self._complete_question(user_id, question)
+                return True
+            batch = self.db.batch()
+            for ref, data in self._question_status_writes(user_id, question, status, date_str):
+                batch.set(ref, data, merge=True)
+            batch.commit()
             return True
         except Exception as e:
             logger.error(f"Error updating question status for {user_id}: {e}")
             return False
 
-    def get_completed_questions(self, user_id):
-        try:
-            tracking_data = self.get_user_tracking(user_id)
-            completed_questions = []
-            for question_key, question_data in tracking_data.items():
-                if isinstance(question_data, dict):
-                    status = question_data.get('status')
-                    original_title = question_data.get('original_title', question_key)
-                    if status in ['done', 'missed']:
-                        completed_questions.append(original_title)
-                elif question_data in ['done', 'missed']:
-                    completed_questions.append(question_key)
-            return completed_questions
-        except Exception as e:
-            logger.error(f"Error getting completed questions for {user_id}: {e}")
-            return []
+    def new_write_batch(self):
+        return FirestoreWriteBatch(self)
 
-    def increment_streak(self, user_id):
+    def _progress_from_tracking(self, tracking_data):
+        progress = {status: set() for status in PROGRESS_STATUSES}
+        for question_key, question_data in tracking_data.items():
+            if isinstance(question_data, dict):
+                status = question_data.get('status')
+                qid = question_data.get('id') or question_id_for(question_data.get('original_title', question_key))
+            else:
+                status = question_data
+                qid = question_id_for(question_key)
+            if status in progress:
+                progress[status].add(qid)
+        return progress
+
+    def _migrate_tracking(self, user_id, progress):
+        # Folds the legacy user_tracking/{id} map into the progress arrays
+        # once. Ids already present were written after the switch and win.
+        legacy = self._progress_from_tracking(self.get_user_tracking(user_id))
+        known = set().union(*progress.values())
+        data = {'migrated': True}
+        for status, ids in legacy.items():
+            ids -= known
+            if ids:
+                data[status] = firestore.ArrayUnion(sorted(ids))
+                progress[status] |= ids
+        self._progress_ref(user_id).set(data, merge=True)
+        return progress
+
+    def get_user_progress(self, user_id):
         try:
-            user_ref = self.db.collection('users').document(str(user_id))
-            doc = user_ref.get()
-            current_streak = 1
-            if doc.exists:
-                data = doc.to_dict()
-                current_streak = data.get('streak', 0) + 1
-            user_ref.set({
-                'streak': current_streak,
-                'last_streak_update': datetime.now().isoformat()
-            }, merge=True)
-            return current_streak
+            doc = self._progress_ref(user_id).get()
+            data = doc.to_dict() if doc.exists else {}
+            progress = {status: set(data.get(status, [])) for status in PROGRESS_STATUSES}
+            if not data.get('migrated'):
+                progress = self._migrate_tracking(user_id, progress)
+            return progress
         except Exception as e:
-            logger.error(f"Error incrementing streak for user {user_id}: {e}")
-            return 1
+            logger.error(f"Error getting progress for {user_id}: {e}")
+            return {status: set() for status in PROGRESS_STATUSES}
 
-    def reset_streak(self, user_id):
+    def get_user_stats(self, user_id):
         try:
-            user_ref = self.db.collection('users').document(str(user_id))
-            user_ref.set({
-                'streak': 0,
-                'last_streak_update': datetime.now().isoformat(),
-                'streak_reset_reason': 'missed_question'
-            }, merge=True)
-            return True
+            stats_ref = self._stats_ref(user_id)
+            doc = stats_ref.get()
+            stats = doc.to_dict() if doc.exists else {}
+            if stats.get('seeded'):
+                return stats
+            # Users who answered questions before the counters existed get
+            # their totals seeded from the progress arrays, once.
+            self.get_user_progress(user_id)
+            progress_ref = self._progress_ref(user_id)
+
+            @firestore.transactional
+            def seed(transaction):
+                stats_doc = stats_ref.get(transaction=transaction)
+                progress_doc = progress_ref.get(transaction=transaction)
+                current = stats_doc.to_dict() if stats_doc.exists else {}
+                if current.get('seeded'):
+                    return current
+                progress = progress_doc.to_dict() if progress_doc.exists else {}
+                current['seeded'] = True
+                for status in STATS_STATUSES:
+                    current[status] = len(progress.get(status, []))
+                transaction.set(stats_ref, {key: current[key] for key in ('seeded',) + STATS_STATUSES}, merge=True)
+                return current
+
+            return seed(self.db.transaction())
         except Exception as e:
-            logger.error(f"Error resetting streak for user {user_id}: {e}")
-            return False
+            logger.error(f"Error getting stats for {user_id}: {e}")
+            return {}
+
+    def _complete_question(self, user_id, question):
+        # /done runs as one transaction over users/{id}: the streak is a
+        # read-modify-write, and the status, stats and streak writes land
+        # together or not at all, so concurrent taps can't double count.
+        user_ref = self.db.collection('users').document(str(user_id))
+
+        @firestore.transactional
+        def complete(transaction):
+            doc = user_ref.get(transaction=transaction)
+            data = doc.to_dict() if doc.exists else {}
+            date_str = local_date(data.get('reminder_settings'))
+            for ref, write in self._question_status_writes(user_id, question, 'done', date_str):
+                transaction.set(ref, write, merge=True)
+            streak = next_streak(data, date_str)
+            transaction.set(user_ref, streak, merge=True)
+            return streak['streak']
+
+        return complete(self.db.transaction())
+
+    def resolve_active_question(self, user_id, status=None, date_str=None, question_id=None):
+        # /done, /missed and the deadline job all end an assignment here, so
+        # whichever commits first wins and the others see no active question.
+        user_ref = self.db.collection('users').document(str(user_id))
+
+        @firestore.transactional
+        def resolve(transaction):
+            doc = user_ref.get(transaction=transaction)
+            data = doc.to_dict() if doc.exists else {}
+            question = data.get('active_question') or None
+            if not question or (question_id and question_id_for(question) != question_id):
+                return None
+            user_update = self._active_question_data(None)
+            if status:
+                day = date_str or local_date(data.get('reminder_settings'))
+                for ref, write in self._question_status_writes(user_id, question, status, day):
+                    if ref.path == user_ref.path:
+                        user_update.update(write)
+                    else:
+                        transaction.set(ref, write, merge=True)
+                if status == 'done':
+                    user_update.update(next_streak(data, day))
+            else:
+                transaction.set(
+                    self._progress_ref(user_id),
+                    {'pending': firestore.ArrayRemove([question_id_for(question)])},
+                    merge=True
+                )
+            transaction.set(user_ref, user_update, merge=True)
+            return question
+
+        return resolve(self.db.transaction())
 
     def get_user_streak(self, user_id):
         try:
@@ -288,7 +493,161 @@ class FirebaseManager:
             return 0
 
 
-class GoogleSheetsManager:
+class FirestoreWriteBatch:
+    # Collects scheduler side effects and commits them in WriteBatch chunks.
+    # A failed chunk is retried per user so one bad write only fails its owner.
+    MAX_OPS = 500
+
+    def __init__(self, firebase_manager, max_ops=MAX_OPS):
+        self.firebase = firebase_manager
+        self.db = firebase_manager.db
+        self.max_ops = max_ops
+        self._ops = []
+
+    def __len__(self):
+        return len(self._ops)
+
+    def set(self, user_id, ref, data):
+        self._ops.append((user_id, ref, data))
+
+    def queue_question_status(self, user_id, question, status, date_str=None):
+        for ref, data in self.firebase._question_status_writes(user_id, question, status, date_str):
+            self.set(user_id, ref, data)
+
+    def queue_active_question(self, user_id, question):
+        user_ref = self.db.collection('users').document(str(user_id))
+        self.set(user_id, user_ref, self.firebase._active_question_data(question))
+
+    def _commit(self, ops):
+        batch = self.db.batch()
+        for _, ref, data in ops:
+            batch.set(ref, data, merge=True)
+        batch.commit()
+
+    def flush(self):
+        ops, self._ops = self._ops, []
+        failed_users = set()
+        for start in range(0, len(ops), self.max_ops):
+            chunk = ops[start:start + self.max_ops]
+            try:
+                self._commit(chunk)
+            except Exception as e:
+                logger.error(f"Error committing write batch of {len(chunk)} ops, retrying per user: {e}")
+                by_user = {}
+                for op in chunk:
+                    by_user.setdefault(op[0], []).append(op)
+                for user_id, user_ops in by_user.items():
+                    try:
+                        self._commit(user_ops)
+                    except Exception as e:
+                        logger.error(f"Error committing writes for user {user_id}: {e}")
+                        failed_users.add(user_id)
+        return failed_users
+
+
+class AsyncFirebaseManager:
+    # Runs the blocking Firestore client on a bounded thread pool so handlers
+    # and jobs can await it without stalling the event loop.
+    def __init__(self, firebase_manager=None, max_workers=None):
+        self.sync = firebase_manager if firebase_manager else create_storage()
+        if max_workers is None:
+            max_workers = int(os.getenv('FIRESTORE_MAX_WORKERS', '16'))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='firestore')
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def __getattr__(self, name):
+        attr = getattr(self.sync, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        if metrics.ENABLED:
+            latency = metrics.STORAGE_LATENCY.labels(name)
+            errors = metrics.STORAGE_ERRORS.labels(name)
+            run = call
+
+            async def call(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await run(*args, **kwargs)
+                except Exception:
+                    errors.inc()
+                    raise
+                finally:
+                    latency.observe(time.perf_counter() - started)
+
+        call.__name__ = name
+        setattr(self, name, call)
+        return call
+
+    def new_write_batch(self):
+        return self.sync.new_write_batch()
+
+    async def flush_writes(self, batch):
+        started = time.perf_counter()
+        try:
+            return await self.run(batch.flush)
+        finally:
+            metrics.STORAGE_LATENCY.labels('flush_writes').observe(time.perf_counter() - started)
+
+
+class ActiveQuestionStore:
+    # Write-through LRU over users/{id}.active_question: entries are cached
+    # only after the durable write succeeds. Ending an assignment always
+    # goes through storage in one transaction, so the cache can only answer
+    # "nothing active" without a read. That answer is only safe while this
+    # process makes every assignment; sharded workers pass capacity=0.
+    def __init__(self, firebase_manager, capacity=None):
+        self.firebase = firebase_manager
+        if capacity is None:
+            capacity = int(os.getenv('ACTIVE_QUESTION_CACHE_SIZE', '10000'))
+        self.capacity = capacity
+        self._cache = OrderedDict()
+
+    def remember(self, user_id, question):
+        self._cache[user_id] = question or None
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+
+    def forget(self, user_id):
+        self._cache.pop(user_id, None)
+
+    async def assign(self, user_id, question):
+        # The active question and its pending status commit together, so a
+        # question is either fully assigned or not at all.
+        self.forget(user_id)
+        batch = self.firebase.new_write_batch()
+        batch.queue_active_question(user_id, question)
+        batch.queue_question_status(user_id, question, "pending")
+        if await self.firebase.flush_writes(batch):
+            return False
+        self.remember(user_id, question)
+        return True
+
+    async def resolve(self, user_id, status=None, date_str=None, question=None):
+        # Returns the question that was ended, or None if another handler or
+        # job got there first. Storage errors propagate to the caller.
+        if user_id in self._cache and self._cache[user_id] is None:
+            self._cache.move_to_end(user_id)
+            return None
+        question_id = question_id_for(question) if question else None
+        try:
+            resolved = await self.firebase.resolve_active_question(user_id, status, date_str, question_id)
+        except Exception:
+            self.forget(user_id)
+            raise
+        if resolved or not question:
+            self.remember(user_id, None)
+        return resolved
+
+
+class GoogleSheetsManager(CatalogSource):
     def __init__(self):
         try:
             credentials_json = os.getenv('GOOGLE_SHEETS_CREDENTIALS')
@@ -308,12 +667,26 @@ class GoogleSheetsManager:
                 raise FileNotFoundError("Google Sheets credentials not found in env or file.")
 
             self.gc = gspread.authorize(self.creds)
-            self.sheet = self.gc.open(sheet_name).worksheet(sheet_tab)
+            self.spreadsheet = self.gc.open(sheet_name)
+            self.sheet = self.spreadsheet.worksheet(sheet_tab)
             logger.info(f"Google Sheets initialized successfully: {sheet_name} - {sheet_tab}")
         except Exception as e:
             logger.error(f"Error initializing Google Sheets: {e}")
             raise RuntimeError(f"Error initializing Google Sheets: {e}")
 
+    def get_revision(self):
+        # Drive metadata is a tiny request, so it gates the full download.
+        try:
+            response = self.gc.request(
+                'get', f"{DRIVE_FILES_API_V3_URL}/{self.spreadsheet.id}",
+                params={'fields': 'modifiedTime,version', 'supportsAllDrives': True}
+            )
+            metadata = response.json()
+            return f"{metadata.get('modifiedTime', '')}:{metadata.get('version', '')}"
+        except Exception as e:
+            logger.error(f"Error fetching sheet revision: {e}")
+            return None
+
     def fetch_questions(self):
         try:
             records = self.sheet.get_all_records()
@@ -332,61 +705,159 @@ class GoogleSheetsManager:
             logger.error(f"Error fetching questions: {e}")
             return []
 
+def create_storage(backend=None):
+    backend = backend or os.getenv('STORAGE_BACKEND', 'firestore')
+    if backend == 'memory':
+        return MemoryStorage()
+    if backend == 'sqlite':
+        return SQLiteStorage(os.getenv('SQLITE_PATH', 'dsa_bot.db'))
+    return FirebaseManager()
+
+
+def create_catalog_source(source=None):
+    source = source or os.getenv('CATALOG_SOURCE', 'sheets')
+    if source == 'memory':
+        return MemoryCatalogSource.from_file(os.getenv('CATALOG_SNAPSHOT_PATH', DEFAULT_SNAPSHOT_PATH))
+    if source == 'sqlite':
+        return SQLiteCatalogSource(os.getenv('CATALOG_SQLITE_PATH', os.getenv('SQLITE_PATH', 'dsa_bot.db')))
+    return GoogleSheetsManager()
+
+
 class DSAQuestionMatcher:
     def __init__(self, firebase_manager=None, google_sheets_manager=None):
-        self.firebase = firebase_manager if firebase_manager else FirebaseManager()
-        self.sheets = google_sheets_manager if google_sheets_manager else GoogleSheetsManager()
-        self.questions_cache = None
-        self.cache_timestamp = None
+        self.firebase = firebase_manager if firebase_manager else AsyncFirebaseManager()
+        self._sheets = google_sheets_manager
         self.cache_duration = 3600  # 1 hour
+        self.snapshot_path = os.getenv('CATALOG_SNAPSHOT_PATH', DEFAULT_SNAPSHOT_PATH)
+        self.offline = os.getenv('CATALOG_OFFLINE', '0') == '1'
+        self._refresh_task = None
+        self._last_refresh_attempt = 0.0
+        self.catalog = load_snapshot(self.snapshot_path)
+        self.profile_cache = ProfileCache(int(os.getenv('PROFILE_CACHE_SIZE', '256')))
+        metrics.watch_profile_cache(self.profile_cache)
+        metrics.CATALOG_QUESTIONS.set_function(lambda: len(self.catalog) if self.catalog else 0)
+        self.sampler = QuestionSampler(self.profile_cache, parse_weights(os.getenv('QUESTION_DIFFICULTY_WEIGHTS')))
+
+    @property
+    def sheets(self):
+        # Connected on first sync so boot never waits on Google auth.
+        if self._sheets is None:
+            self._sheets = create_catalog_source()
+        return self._sheets
 
     def _is_cache_valid(self):
-        if not self.questions_cache or not self.cache_timestamp:
+        catalog = self.catalog
+        if not catalog:
+            return False
+        return time.time() - catalog.loaded_at < self.cache_duration
+
+    def fetch_catalog_changes(self):
+        # Runs off the event loop. Returns a full QuestionCatalog when there is
+        # nothing to diff against (or most rows changed), a CatalogDiff
+        # otherwise, and None when the fetch failed.
+        catalog = self.catalog
+        revision = self.sheets.get_revision()
+        if catalog and revision and revision == catalog.revision:
+            return CatalogDiff({}, [], {}, revision, catalog.order)
+        questions = self.sheets.fetch_questions()
+        if not questions:
+            if catalog:
+                logger.warning(f"Catalog refresh returned no questions, keeping {len(catalog)} cached questions")
+            return None
+        if catalog is None:
+            return QuestionCatalog(questions, revision=revision)
+        diff = catalog.diff(questions, revision)
+        if len(diff.added) + len(diff.removed) + len(diff.changed) > len(catalog) // 4:
+            return QuestionCatalog(questions, revision=revision)
+        return diff
+
+    async def refresh_catalog_job(self, context=None):
+        # Concurrent callers wait for the refresh already in flight instead
+        # of returning before it has produced a catalog.
+        if self.offline:
+            return False
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._refresh_catalog())
+        return await asyncio.shield(self._refresh_task)
+
+    async def _refresh_catalog(self):
+        self._last_refresh_attempt = time.time()
+        loop = asyncio.get_running_loop()
+        try:
+            started = time.perf_counter()
+            changes = await loop.run_in_executor(None, self.fetch_catalog_changes)
+            metrics.SHEET_FETCH_SECONDS.observe(time.perf_counter() - started)
+            if changes is None:
+                return False
+            if isinstance(changes, QuestionCatalog):
+                self.catalog = changes
+                logger.info(f"Question catalog loaded with {len(changes)} questions (version {changes.version})")
+            else:
+                previous_revision = self.catalog.revision
+                self.catalog.apply(changes)
+                if not changes and changes.revision == previous_revision:
+                    return True
+                logger.info(f"Question catalog synced: {changes} (version {self.catalog.version})")
+            await loop.run_in_executor(None, save_snapshot, self.catalog.to_snapshot(), self.snapshot_path)
+            return True
+        except Exception as e:
+            logger.error(f"Error refreshing question catalog: {e}")
             return False
-        current_time = datetime.now()
-        return (current_time - self.cache_timestamp).total_seconds() < self.cache_duration
+
+    async def get_catalog(self):
+        if self.catalog is None:
+            await self.refresh_catalog_job()
+        elif not self._is_cache_valid() and time.time() - self._last_refresh_attempt > 60:
+            # Serve the stale catalog and revalidate in the background.
+            asyncio.ensure_future(self.refresh_catalog_job())
+        return self.catalog
 
     def get_all_questions(self):
-        if not self._is_cache_valid():
-            self.questions_cache = self.sheets.fetch_questions()
-            self.cache_timestamp = datetime.now()
-        return self.questions_cache
+        if self.catalog is None and not self.offline:
+            changes = self.fetch_catalog_changes()
+            if isinstance(changes, QuestionCatalog):
+                self.catalog = changes
+        return self.catalog.questions if self.catalog else []
+
+    async def pick_question(self, user_id, user_prefs=None):
+        # Never repeats a question the user has seen, pending ones included,
+        # until every matching question has been served; after that,
+        # unanswered pending questions come around again.
+        try:
+            if user_prefs is None:
+                user_prefs = await self.firebase.get_user_prefs(user_id)
+            if not user_prefs:
+                return None, "No preferences set. Use /setup to set your preferences."
+            catalog = await self.get_catalog()
+            if not catalog:
+                return None, "No questions available. Please try again later."
+            progress = await self.firebase.get_user_progress(user_id)
+            answered = progress['done'] | progress['missed']
+            question = self.sampler.draw(catalog, user_prefs, answered | progress['pending'], key=user_id)
+            if question is None and progress['pending']:
+                question = self.sampler.draw(catalog, user_prefs, answered, key=user_id)
+            if question is None:
+                return None, "No matching questions found based on your preferences, or all questions completed."
+            return question, None
+        except Exception as e:
+            logger.error(f"Error picking question for user {user_id}: {e}")
+            return None, f"Error retrieving questions: {str(e)}"
 
-    async def get_matching_questions(self, user_id):
+    async def get_matching_questions(self, user_id, user_prefs=None):
         try:
-            user_prefs = self.firebase.get_user_prefs(user_id)
+            if user_prefs is None:
+                user_prefs = await self.firebase.get_user_prefs(user_id)
             if not user_prefs:
                 return [], "No preferences set. Use /setup to set your preferences."
-            all_questions = self.get_all_questions()
-            if not all_questions:
+            catalog = await self.get_catalog()
+            if not catalog:
                 return [], "No questions available. Please try again later."
-            completed_questions = self.firebase.get_completed_questions(user_id)
-            filtered_questions = []
-            for question in all_questions:
-                question_title = question.get('Question', '')
-                if question_title in completed_questions:
-                    continue
-                difficulty_prefs = user_prefs.get('difficulty', [])
-                if 'Random' not in difficulty_prefs:
-                    question_difficulty = question.get('Difficulty', '')
-                    if question_difficulty not in difficulty_prefs:
-                        continue
-                topic_prefs = user_prefs.get('topic', [])
-                if 'Random' not in topic_prefs:
-                    question_topics = question.get('Topics', '')
-                    topic_match = any(topic.strip().lower() in question_topics.lower() for topic in topic_prefs)
-                    if not topic_match:
-                        continue
-                company_prefs = user_prefs.get('company', [])
-                if 'Random' not in company_prefs and 'No preference' not in company_prefs:
-                    question_companies = question.get('Companies', '')
-                    company_match = any(company.strip().lower() in question_companies.lower() for company in company_prefs)
-                    if not company_match:
-                        continue
-                filtered_questions.append(question)
+            completed_questions = await self.firebase.get_completed_questions(user_id)
+            pool = self.profile_cache.get(catalog, user_prefs)
+            filtered_questions = [catalog.index.questions[qid] for qid in sorted(pool.ids - completed_questions)]
             if not filtered_questions:
                 return [], "No matching questions found based on your preferences, or all questions completed."
             return filtered_questions, None
         except Exception as e:
             logger.error(f"Error getting matching questions for user {user_id}: {e}")
-            return [], f"Error retrieving questions: {str(e)}"
\ No newline at end of file
+            return [], f"Error retrieving questions: {str(e)}"
@@ -0,0 +1,137 @@
+from datetime import datetime, timedelta
+import threading
+
+import pytz
+
+SCHEDULE_KINDS = ('practice', 'reminder', 'deadline')
+MINUTES_PER_DAY = 24 * 60
+DEFAULT_TIMEZONE = 'Asia/Karachi'
+
+
+def minute_of_day(hhmm):
+    try:
+        hours, minutes = hhmm.split(':')
+        minute = int(hours) * 60 + int(minutes)
+    except (AttributeError, ValueError):
+        return None
+    return minute if 0 <= minute < MINUTES_PER_DAY else None
+
+
+def format_minute(minute):
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def user_timezone(settings):
+    try:
+        return pytz.timezone((settings or {}).get('timezone', DEFAULT_TIMEZONE))
+    except pytz.UnknownTimeZoneError:
+        return pytz.timezone(DEFAULT_TIMEZONE)
+
+
+def local_date(settings, utc_dt=None):
+    utc_dt = utc_dt or datetime.utcnow()
+    return pytz.UTC.localize(utc_dt).astimezone(user_timezone(settings)).strftime("%Y-%m-%d")
+
+
+def stats_periods(date_str):
+    # Bucket keys for the per-day, ISO-week and per-month stats counters.
+    day = datetime.strptime(date_str, "%Y-%m-%d")
+    year, week, _ = day.isocalendar()
+    return {'daily': date_str, 'weekly': f"{year}-W{week:02d}", 'monthly': date_str[:7]}
+
+
+class ScheduleIndex:
+    # In-memory view of every user's reminder_settings, bucketed by UTC minute
+    # so a scheduler tick is a single list lookup instead of a Firestore query.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {kind: [set() for _ in range(MINUTES_PER_DAY)] for kind in SCHEDULE_KINDS}
+        self._user_minutes = {}
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._user_minutes)
+
+    def load(self, settings_by_user):
+        with self._lock:
+            self._buckets = {kind: [set() for _ in range(MINUTES_PER_DAY)] for kind in SCHEDULE_KINDS}
+            self._user_minutes = {}
+            for user_id, settings in settings_by_user.items():
+                self._update(user_id, settings)
+            self.loaded = True
+
+    def _update(self, user_id, settings):
+        minutes = self._user_minutes.setdefault(user_id, {})
+        for kind in SCHEDULE_KINDS:
+            key = f'{kind}_time_utc'
+            if key not in settings:
+                continue
+            old_minute = minutes.pop(kind, None)
+            if old_minute is not None:
+                self._buckets[kind][old_minute].discard(user_id)
+            minute = minute_of_day(settings[key])
+            if minute is not None:
+                self._buckets[kind][minute].add(user_id)
+                minutes[kind] = minute
+        if not minutes:
+            del self._user_minutes[user_id]
+
+    def update(self, user_id, settings):
+        # Mirrors a merge=True write: kinds missing from settings keep their slot.
+        with self._lock:
+            self._update(user_id, settings or {})
+
+    def remove(self, user_id):
+        with self._lock:
+            for kind, minute in self._user_minutes.pop(user_id, {}).items():
+                self._buckets[kind][minute].discard(user_id)
+
+    def users_at(self, kind, hhmm):
+        minute = hhmm if isinstance(hhmm, int) else minute_of_day(hhmm)
+        if minute is None:
+            return []
+        with self._lock:
+            return list(self._buckets[kind][minute])
+
+
+class MinuteCursor:
+    # Tracks the last UTC minute a job finished so ticks process every minute
+    # in (last, now] instead of only the current one.
+    FORMAT = "%Y-%m-%dT%H:%M"
+
+    def __init__(self, last=None, max_catchup=180, max_per_tick=15):
+        self.last = last
+        self.max_catchup = max_catchup
+        self.max_per_tick = max_per_tick
+
+    @classmethod
+    def parse(cls, value):
+        try:
+            return datetime.strptime(value, cls.FORMAT)
+        except (TypeError, ValueError):
+            return None
+
+    def serialize(self):
+        return self.last.strftime(self.FORMAT) if self.last else ''
+
+    def due_minutes(self, now):
+        current = now.replace(second=0, microsecond=0)
+        if self.last is None:
+            return [current]
+        # Anything older than the catch-up window is dropped, and at most
+        # max_per_tick minutes are drained per tick to bound the burst.
+        start = max(self.last + timedelta(minutes=1), current - timedelta(minutes=self.max_catchup - 1))
+        minutes = []
+        while start <= current and len(minutes) < self.max_per_tick:
+            minutes.append(start)
+            start += timedelta(minutes=1)
+        return minutes
+
+    def advance(self, minute):
+        if self.last is None or minute > self.last:
+            self.last = minute
+
+
+def seconds_until_next_minute(now=None, offset=0.0):
+    now = now or datetime.utcnow()
+    return 60 - now.second - now.microsecond / 1_000_000 + offset
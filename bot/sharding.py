@@ -0,0 +1,102 @@
+import logging
+import os
+import socket
+import time
+import uuid
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+def shard_of(user_id, shard_count):
+    return zlib.crc32(str(user_id).encode()) % shard_count
+
+
+class FileShardLease:
+    # Single-host lease: an exclusive flock held for the life of the process.
+    def __init__(self, lock_dir=None):
+        self.lock_dir = lock_dir or os.getenv('SHARD_LOCK_DIR', '/tmp')
+        self._files = {}
+
+    async def acquire(self, name, owner, ttl):
+        if name in self._files:
+            return True
+        import fcntl
+
+        path = os.path.join(self.lock_dir, f"dsa-bot-{name}.lock")
+        # Opened without truncating: the holder's owner string stays readable
+        # until the lock has actually changed hands.
+        lock_file = open(path, 'a+')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.truncate(0)
+        lock_file.write(owner)
+        lock_file.flush()
+        self._files[name] = lock_file
+        return True
+
+
+class FirestoreShardLease:
+    # Multi-host lease: scheduler_leases/{name} claimed in a transaction and
+    # renewed by its owner before the TTL runs out.
+    def __init__(self, firebase_manager):
+        self.firebase = firebase_manager
+
+    async def acquire(self, name, owner, ttl):
+        return await self.firebase.try_acquire_lease(name, owner, ttl)
+
+
+class ShardCoordinator:
+    def __init__(self, firebase_manager=None, worker_id=None, worker_count=None, lease_backend=None, lease_ttl=90):
+        if worker_id is None:
+            worker_id = int(os.getenv('WORKER_ID', '0'))
+        if worker_count is None:
+            worker_count = int(os.getenv('WORKER_COUNT', '1'))
+        if not 0 <= worker_id < worker_count:
+            raise ValueError(f"WORKER_ID must be in [0, {worker_count}), got {worker_id}")
+        self.worker_id = worker_id
+        self.worker_count = worker_count
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.lease_ttl = lease_ttl
+        self._lease_expires = 0.0
+        self.lease = None
+        if self.sharded:
+            lease_backend = lease_backend or os.getenv('SHARD_LEASE', 'firestore')
+            if lease_backend == 'file':
+                self.lease = FileShardLease()
+            else:
+                self.lease = FirestoreShardLease(firebase_manager)
+
+    @property
+    def sharded(self):
+        return self.worker_count > 1
+
+    @property
+    def lease_name(self):
+        return f"shard-{self.worker_id}-of-{self.worker_count}"
+
+    def scoped(self, name):
+        return f"{name}-{self.lease_name}" if self.sharded else name
+
+    def owns(self, user_id):
+        return not self.sharded or shard_of(user_id, self.worker_count) == self.worker_id
+
+    async def ensure_lease(self):
+        if not self.sharded:
+            return True
+        now = time.monotonic()
+        if now < self._lease_expires - self.lease_ttl / 2:
+            return True
+        acquired = await self.lease.acquire(self.lease_name, self.owner, self.lease_ttl)
+        if acquired:
+            if now >= self._lease_expires:
+                logger.info(f"Acquired scheduler lease {self.lease_name} as {self.owner}")
+            self._lease_expires = now + self.lease_ttl
+        else:
+            if now < self._lease_expires:
+                logger.error(f"Lost scheduler lease {self.lease_name}")
+            self._lease_expires = 0.0
+        return acquired
@@ -0,0 +1,112 @@
+import json
+import logging
+import sqlite3
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogSource:
+    # Where the question catalog comes from. get_revision() is a cheap check
+    # that gates the full fetch_questions() download; None means "unknown,
+    # fetch anyway".
+    def get_revision(self):
+        return None
+
+    def fetch_questions(self):
+        raise NotImplementedError
+
+
+class MemoryCatalogSource(CatalogSource):
+    def __init__(self, questions=None):
+        self._questions = [dict(question) for question in questions or []]
+        self._revision = 1
+
+    @classmethod
+    def from_file(cls, path):
+        # Seeds from a catalog snapshot (or any JSON file with a "questions" list).
+        try:
+            with open(path, encoding='utf-8') as f:
+                raw = f.read()
+            return cls(json.loads(raw).get('questions', []) if raw.strip() else [])
+        except FileNotFoundError:
+            return cls()
+
+    def set_questions(self, questions):
+        self._questions = [dict(question) for question in questions]
+        self._revision += 1
+
+    def get_revision(self):
+        return str(self._revision)
+
+    def fetch_questions(self):
+        return [dict(question) for question in self._questions]
+
+
+class SQLiteCatalogSource(CatalogSource):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS questions (
+            position INTEGER PRIMARY KEY,
+            question TEXT NOT NULL,
+            topics TEXT NOT NULL,
+            companies TEXT NOT NULL,
+            difficulty TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS catalog_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def replace_questions(self, questions):
+        rows = [
+            (question.get('Question', ''), question.get('Topics', ''), question.get('Companies', ''), question.get('Difficulty', ''))
+            for question in questions
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM questions")
+                self._conn.executemany(
+                    "INSERT INTO questions (question, topics, companies, difficulty) VALUES (?, ?, ?, ?)", rows
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('revision', ?)", (uuid.uuid4().hex,)
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def get_revision(self):
+        try:
+            with self._lock:
+                row = self._conn.execute("SELECT value FROM catalog_meta WHERE key = 'revision'").fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            logger.error(f"Error reading catalog revision from {self.path}: {e}")
+            return None
+
+    def fetch_questions(self):
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT question, topics, companies, difficulty FROM questions ORDER BY position"
+                ).fetchall()
+            questions = [
+                {"Topics": topics, "Question": question, "Companies": companies, "Difficulty": difficulty}
+                for question, topics, companies, difficulty in rows
+            ]
+            logger.info(f"Fetched {len(questions)} DSA questions from {self.path}")
+            return questions
+        except Exception as e:
+            logger.error(f"Error fetching questions from {self.path}: {e}")
+            return []
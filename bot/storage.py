@@ -0,0 +1,775 @@
+import copy
+import json
+import logging
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from .catalog import as_question_dict, question_id_for, topic_terms
+from .scheduling import SCHEDULE_KINDS, local_date, stats_periods
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+PROGRESS_STATUSES = ('done', 'missed', 'pending')
+STATS_STATUSES = ('done', 'missed')
+
+
+def next_streak(data, date_str):
+    # One completed question per local day extends the streak; a gap of more
+    # than a day starts over at 1.
+    current = data.get('streak', 0)
+    last = data.get('last_activity_date')
+    yesterday = (datetime.strptime(date_str, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+    if last == date_str and current:
+        streak = current
+    elif last in (date_str, yesterday):
+        streak = current + 1
+    else:
+        streak = 1
+    return {
+        'streak': streak,
+        'longest_streak': max(streak, data.get('longest_streak', 0)),
+        'last_activity_date': date_str,
+        'last_streak_update': datetime.now().isoformat()
+    }
+
+
+def reset_streak_data(date_str):
+    return {
+        'streak': 0,
+        'last_activity_date': date_str,
+        'last_streak_update': datetime.now().isoformat(),
+        'streak_reset_reason': 'missed_question'
+    }
+
+
+def stats_counter_paths(question, status, date_str):
+    # Every counter one done/missed transition bumps, as nested key paths
+    # into the per-user stats document.
+    paths = [(status,)]
+    if not isinstance(question, str):
+        difficulty = question.get('Difficulty')
+        if difficulty:
+            paths.append(('by_difficulty', difficulty, status))
+        # Canonical tags, so "Arrays" and "array" share a counter and the
+        # keys line up with what /setup topics match.
+        for topic in topic_terms(question.get('Topics')):
+            paths.append(('by_topic', topic, status))
+    for period, key in stats_periods(date_str).items():
+        paths.append((period, key, status))
+    return paths
+
+
+def history_entry(question, status):
+    return {
+        'id': question_id_for(question),
+        'status': status,
+        'title': question if isinstance(question, str) else question['Question'],
+        'timestamp': datetime.now().isoformat()
+    }
+
+
+def merge_into(target, updates):
+    # Same semantics as a Firestore set(..., merge=True): nested maps merge,
+    # everything else is replaced.
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge_into(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+    return target
+
+
+class UserSnapshot:
+    # Everything the schedulers and handlers need from users/{id}, read once.
+    __slots__ = (
+        'user_id', 'preferences', 'reminder_settings', 'streak', 'longest_streak', 'last_activity_date',
+        'active_question',
+    )
+
+    def __init__(self, user_id, data=None):
+        data = data or {}
+        self.user_id = int(user_id) if str(user_id).lstrip('-').isdigit() else user_id
+        self.preferences = data.get('preferences', {})
+        self.reminder_settings = data.get('reminder_settings', {})
+        self.streak = data.get('streak', 0)
+        self.longest_streak = data.get('longest_streak', self.streak)
+        self.last_activity_date = data.get('last_activity_date')
+        self.active_question = data.get('active_question') or None
+
+    def streak_on(self, date_str):
+        # The stored streak only changes on activity, so a run whose last
+        # day is before yesterday has already lapsed.
+        if not self.last_activity_date:
+            return self.streak
+        yesterday = (datetime.strptime(date_str, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+        return self.streak if self.last_activity_date >= yesterday else 0
+
+    @classmethod
+    def from_document(cls, doc):
+        return cls(doc.id, doc.to_dict() if doc.exists else {})
+
+
+class Storage(ABC):
+    # The persistence surface the handlers, schedulers and leases rely on.
+    # FirebaseManager is the production backend; the local backends below
+    # keep the same document shapes so snapshots and stats read identically.
+    @abstractmethod
+    def get_user_prefs(self, user_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_user_prefs(self, user_id, preferences):
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_user_reminder_settings(self, user_id, settings):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_user_reminder_settings(self, user_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_user_data(self, user_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_user_snapshot(self, user_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_user_snapshots(self, user_ids):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_user_snapshots_with_time(self, kind, utc_time_str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_all_reminder_settings(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_latest_settings_update(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_reminder_settings_updated_since(self, since):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_scheduler_cursor(self, name):
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_scheduler_cursor(self, name, minute_str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def try_acquire_lease(self, name, owner, ttl_seconds):
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim_delivery(self, user_id, kind, date_str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def release_delivery(self, user_id, kind, date_str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_active_question(self, user_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_active_question(self, user_id, question):
+        raise NotImplementedError
+
+    @abstractmethod
+    def resolve_active_question(self, user_id, status=None, date_str=None, question_id=None):
+        # Clears users/{id}.active_question and records `status` for it in
+        # one transaction; returns the question, or None if there was none
+        # (or, with question_id, if it has since been replaced). With no
+        # status the assignment is withdrawn from `pending` instead.
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_question_status(self, user_id, question, status, date_str=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_user_progress(self, user_id):
+        raise NotImplementedError
+
+    def get_completed_questions(self, user_id):
+        progress = self.get_user_progress(user_id)
+        return progress['done'] | progress['missed']
+
+    @abstractmethod
+    def get_user_stats(self, user_id):
+        raise NotImplementedError
+
+    def get_user_streak(self, user_id):
+        return self.get_user_snapshot(user_id).streak
+
+    @abstractmethod
+    def new_write_batch(self):
+        raise NotImplementedError
+
+
+class LocalWriteBatch:
+    # Mirrors FirestoreWriteBatch: ops commit together, and on failure are
+    # retried per user so one bad write only fails its owner.
+    def __init__(self, storage):
+        self.storage = storage
+        self._ops = []
+
+    def __len__(self):
+        return len(self._ops)
+
+    def queue_question_status(self, user_id, question, status, date_str=None):
+        self._ops.append((user_id, lambda: self.storage._apply_question_status(user_id, question, status, date_str)))
+
+    def queue_active_question(self, user_id, question):
+        self._ops.append((user_id, lambda: self.storage._write_active_question(user_id, question)))
+
+    def flush(self):
+        ops, self._ops = self._ops, []
+        if not ops:
+            return set()
+        try:
+            with self.storage._transaction():
+                for _, op in ops:
+                    op()
+            return set()
+        except Exception as e:
+            logger.error(f"Error committing write batch of {len(ops)} ops, retrying per user: {e}")
+        by_user = {}
+        for user_id, op in ops:
+            by_user.setdefault(user_id, []).append(op)
+        failed_users = set()
+        for user_id, user_ops in by_user.items():
+            try:
+                with self.storage._transaction():
+                    for op in user_ops:
+                        op()
+            except Exception as e:
+                logger.error(f"Error committing writes for user {user_id}: {e}")
+                failed_users.add(user_id)
+        return failed_users
+
+
+class LocalStorage(Storage):
+    # Business logic shared by the in-memory and SQLite backends, written
+    # against a handful of document primitives. Every read-modify-write runs
+    # inside _transaction(), so concurrent handlers can't interleave.
+    def __init__(self):
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            yield
+
+    @abstractmethod
+    def _get_user(self, user_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _put_user(self, user_id, data):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _iter_users(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _user_ids_at(self, kind, utc_time_str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _iter_users_updated_since(self, since):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _latest_update(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _get_doc(self, collection, key):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _put_doc(self, collection, key, data):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _delete_doc(self, collection, key):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _append_history(self, user_id, entry):
+        raise NotImplementedError
+
+    def _merge_user(self, user_id, updates):
+        with self._transaction():
+            data = self._get_user(user_id)
+            self._put_user(user_id, merge_into(data, updates))
+
+    def get_user_prefs(self, user_id):
+        try:
+            return self._get_user(user_id).get('preferences', {})
+        except Exception as e:
+            logger.error(f"Error getting user preferences: {e}")
+            return {}
+
+    def set_user_prefs(self, user_id, preferences):
+        try:
+            self._merge_user(user_id, {'preferences': preferences})
+            return True
+        except Exception as e:
+            logger.error(f"Error setting user preferences: {e}")
+            return False
+
+    def set_user_reminder_settings(self, user_id, settings):
+        try:
+            self._merge_user(user_id, {
+                'reminder_settings': settings,
+                'last_updated': datetime.now(timezone.utc).isoformat(timespec='microseconds'),
+            })
+            return True
+        except Exception as e:
+            logger.error(f"Error saving reminder settings for user {user_id}: {e}")
+            return False
+
+    def get_user_reminder_settings(self, user_id):
+        try:
+            return self._get_user(user_id).get('reminder_settings', {})
+        except Exception as e:
+            logger.error(f"Error getting reminder settings: {e}")
+            return {}
+
+    def get_user_data(self, user_id):
+        try:
+            return self._get_user(user_id)
+        except Exception as e:
+            logger.error(f"Error getting user data for user {user_id}: {e}")
+            return {}
+
+    def get_user_snapshot(self, user_id):
+        try:
+            return UserSnapshot(user_id, self._get_user(user_id))
+        except Exception as e:
+            logger.error(f"Error getting user snapshot for user {user_id}: {e}")
+            return UserSnapshot(user_id)
+
+    def get_user_snapshots(self, user_ids):
+        try:
+            return [UserSnapshot(user_id, self._get_user(user_id)) for user_id in user_ids]
+        except Exception as e:
+            logger.error(f"Error getting user snapshots for {len(user_ids)} users: {e}")
+            return []
+
+    def get_user_snapshots_with_time(self, kind, utc_time_str):
+        try:
+            return self.get_user_snapshots(self._user_ids_at(kind, utc_time_str))
+        except Exception as e:
+            logger.error(f"Error getting users for {kind} time {utc_time_str}: {e}")
+            return []
+
+    def get_all_reminder_settings(self):
+        try:
+            settings_by_user = {}
+            for user_id, data in self._iter_users():
+                settings = data.get('reminder_settings')
+                if settings:
+                    settings_by_user[UserSnapshot(user_id).user_id] = settings
+            return settings_by_user
+        except Exception as e:
+            logger.error(f"Error loading reminder settings for all users: {e}")
+            return None
+
+    def get_latest_settings_update(self):
+        try:
+            return self._latest_update()
+        except Exception as e:
+            logger.error(f"Error getting latest reminder settings update: {e}")
+            return None
+
+    def get_reminder_settings_updated_since(self, since):
+        try:
+            settings_by_user = {}
+            newest = since
+            for user_id, data in self._iter_users_updated_since(since or ''):
+                settings_by_user[UserSnapshot(user_id).user_id] = data.get('reminder_settings', {})
+                if newest is None or data['last_updated'] > newest:
+                    newest = data['last_updated']
+            return settings_by_user, newest
+        except Exception as e:
+            logger.error(f"Error loading reminder settings updated since {since}: {e}")
+            return {}, since
+
+    def get_scheduler_cursor(self, name):
+        try:
+            return (self._get_doc('scheduler_state', name) or {}).get('last_processed_minute', '')
+        except Exception as e:
+            logger.error(f"Error getting scheduler cursor {name}: {e}")
+            return None
+
+    def set_scheduler_cursor(self, name, minute_str):
+        try:
+            self._put_doc('scheduler_state', name, {
+                'last_processed_minute': minute_str,
+                'updated_at': datetime.now().isoformat()
+            })
+            return True
+        except Exception as e:
+            logger.error(f"Error saving scheduler cursor {name}: {e}")
+            return False
+
+    def try_acquire_lease(self, name, owner, ttl_seconds):
+        try:
+            with self._transaction():
+                now = datetime.utcnow()
+                data = self._get_doc('scheduler_leases', name)
+                if data and data.get('owner') != owner and data.get('expires_at', '') > now.isoformat():
+                    return False
+                self._put_doc('scheduler_leases', name, {
+                    'owner': owner,
+                    'expires_at': (now + timedelta(seconds=ttl_seconds)).isoformat(),
+                    'renewed_at': now.isoformat()
+                })
+                return True
+        except Exception as e:
+            logger.error(f"Error acquiring lease {name}: {e}")
+            return False
+
+    def claim_delivery(self, user_id, kind, date_str):
+        try:
+            key = f"{user_id}_{kind}_{date_str}"
+            with self._transaction():
+                if self._get_doc('delivery_ledger', key) is not None:
+                    return False
+                self._put_doc('delivery_ledger', key, {
+                    'user_id': str(user_id),
+                    'kind': kind,
+                    'date': date_str,
+                    'claimed_at': datetime.now().isoformat()
+                })
+                return True
+        except Exception as e:
+            logger.error(f"Error claiming {kind} delivery for user {user_id} on {date_str}: {e}")
+            return None
+
+    def release_delivery(self, user_id, kind, date_str):
+        try:
+            self._delete_doc('delivery_ledger', f"{user_id}_{kind}_{date_str}")
+            return True
+        except Exception as e:
+            logger.error(f"Error releasing {kind} delivery for user {user_id} on {date_str}: {e}")
+            return False
+
+    def get_active_question(self, user_id):
+        try:
+            return self._get_user(user_id).get('active_question') or None
+        except Exception as e:
+            logger.error(f"Error getting active question for user {user_id}: {e}")
+            raise
+
+    def _write_active_question(self, user_id, question):
+        with self._transaction():
+            data = self._get_user(user_id)
+            if question:
+                data['active_question'] = dict(as_question_dict(question), assigned_at=datetime.now().isoformat())
+            else:
+                data.pop('active_question', None)
+            self._put_user(user_id, data)
+
+    def set_active_question(self, user_id, question):
+        try:
+            self._write_active_question(user_id, question)
+            return True
+        except Exception as e:
+            logger.error(f"Error setting active question for user {user_id}: {e}")
+            return False
+
+    def resolve_active_question(self, user_id, status=None, date_str=None, question_id=None):
+        with self._transaction():
+            question = self._get_user(user_id).get('active_question') or None
+            if not question or (question_id and question_id_for(question) != question_id):
+                return None
+            self._write_active_question(user_id, None)
+            if status:
+                self._apply_question_status(user_id, question, status, date_str)
+            else:
+                progress = self._get_doc('user_progress', user_id)
+                if progress:
+                    qid = question_id_for(question)
+                    progress['pending'] = [i for i in progress.get('pending', []) if i != qid]
+                    self._put_doc('user_progress', user_id, progress)
+            return question
+
+    def _apply_question_status(self, user_id, question, status, date_str=None):
+        with self._transaction():
+            qid = question_id_for(question)
+            progress = self._get_doc('user_progress', user_id) or {'migrated': True}
+            for other in PROGRESS_STATUSES:
+                ids = [i for i in progress.get(other, []) if i != qid]
+                if other == status:
+                    ids.append(qid)
+                progress[other] = ids
+            progress['updated_at'] = datetime.now().isoformat()
+            self._put_doc('user_progress', user_id, progress)
+            self._append_history(user_id, history_entry(question, status))
+            if status not in STATS_STATUSES:
+                return
+            user = self._get_user(user_id)
+            if date_str is None:
+                date_str = local_date(user.get('reminder_settings'))
+            stats = self._get_doc('user_stats', user_id) or {'seeded': True}
+            for path in stats_counter_paths(question, status, date_str):
+                node = stats
+                for key in path[:-1]:
+                    node = node.setdefault(key, {})
+                node[path[-1]] = node.get(path[-1], 0) + 1
+            stats['updated_at'] = datetime.now().isoformat()
+            self._put_doc('user_stats', user_id, stats)
+            streak = next_streak(user, date_str) if status == 'done' else reset_streak_data(date_str)
+            self._put_user(user_id, merge_into(user, streak))
+
+    def update_question_status(self, user_id, question, status, date_str=None):
+        try:
+            self._apply_question_status(user_id, question, status, date_str)
+            return True
+        except Exception as e:
+            logger.error(f"Error updating question status for {user_id}: {e}")
+            return False
+
+    def get_user_progress(self, user_id):
+        try:
+            data = self._get_doc('user_progress', user_id) or {}
+            return {status: set(data.get(status, [])) for status in PROGRESS_STATUSES}
+        except Exception as e:
+            logger.error(f"Error getting progress for {user_id}: {e}")
+            return {status: set() for status in PROGRESS_STATUSES}
+
+    def get_user_stats(self, user_id):
+        try:
+            return self._get_doc('user_stats', user_id) or {}
+        except Exception as e:
+            logger.error(f"Error getting stats for {user_id}: {e}")
+            return {}
+
+    def new_write_batch(self):
+        return LocalWriteBatch(self)
+
+
+class MemoryStorage(LocalStorage):
+    # Process-local dicts; for tests, benchmarks and throwaway runs. Writes
+    # made inside a transaction are journaled and undone if it fails, so a
+    # failed batch leaves nothing behind, as with SQLite and Firestore.
+    def __init__(self):
+        super().__init__()
+        self._users = {}
+        self._docs = {}
+        self._history = {}
+        self._undo = None
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            if self._undo is not None:
+                yield
+                return
+            self._undo = []
+            try:
+                yield
+            except BaseException:
+                for undo in reversed(self._undo):
+                    undo()
+                raise
+            finally:
+                self._undo = None
+
+    def _journal(self, store, key):
+        if self._undo is None:
+            return
+        previous = store.get(key, _MISSING)
+        if previous is _MISSING:
+            self._undo.append(lambda: store.pop(key, None))
+        else:
+            self._undo.append(lambda: store.__setitem__(key, previous))
+
+    def _get_user(self, user_id):
+        return copy.deepcopy(self._users.get(str(user_id), {}))
+
+    def _put_user(self, user_id, data):
+        self._journal(self._users, str(user_id))
+        self._users[str(user_id)] = data
+
+    def _iter_users(self):
+        return list(self._users.items())
+
+    def _user_ids_at(self, kind, utc_time_str):
+        key = f'{kind}_time_utc'
+        return [
+            user_id for user_id, data in self._users.items()
+            if data.get('reminder_settings', {}).get(key) == utc_time_str
+        ]
+
+    def _iter_users_updated_since(self, since):
+        return [(user_id, data) for user_id, data in self._users.items() if data.get('last_updated', '') > since]
+
+    def _latest_update(self):
+        return max((data['last_updated'] for data in self._users.values() if data.get('last_updated')), default=None)
+
+    def _get_doc(self, collection, key):
+        data = self._docs.get((collection, str(key)))
+        return copy.deepcopy(data) if data is not None else None
+
+    def _put_doc(self, collection, key, data):
+        self._journal(self._docs, (collection, str(key)))
+        self._docs[(collection, str(key))] = data
+
+    def _delete_doc(self, collection, key):
+        self._journal(self._docs, (collection, str(key)))
+        self._docs.pop((collection, str(key)), None)
+
+    def _append_history(self, user_id, entry):
+        entries = self._history.setdefault(str(user_id), [])
+        entries.append(entry)
+        if self._undo is not None:
+            self._undo.append(entries.pop)
+
+
+class SQLiteStorage(LocalStorage):
+    # Single-file backend for small deployments. WAL lets readers run while a
+    # write commits; schedule times are real indexed columns so a minute
+    # bucket lookup never scans the users table.
+    SCHEMA = f"""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            {', '.join(f'{kind}_time_utc TEXT' for kind in SCHEDULE_KINDS)},
+            last_updated TEXT
+        );
+        {' '.join(f'CREATE INDEX IF NOT EXISTS users_{kind}_time ON users ({kind}_time_utc);' for kind in SCHEDULE_KINDS)}
+        CREATE INDEX IF NOT EXISTS users_last_updated ON users (last_updated);
+        CREATE TABLE IF NOT EXISTS documents (
+            collection TEXT NOT NULL,
+            key TEXT NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (collection, key)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS history (
+            id INTEGER PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS history_user ON history (user_id);
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        # One shared connection guarded by the storage lock; autocommit mode
+        # with explicit BEGIN IMMEDIATE so each _transaction() is one commit.
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, cached_statements=256)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self._depth = 0
+        logger.info(f"SQLite storage opened at {path}")
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._depth = 1
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._conn.execute("COMMIT")
+            finally:
+                self._depth = 0
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _get_user(self, user_id):
+        rows = self._query("SELECT data FROM users WHERE user_id = ?", (str(user_id),))
+        return json.loads(rows[0][0]) if rows else {}
+
+    def _put_user(self, user_id, data):
+        settings = data.get('reminder_settings', {})
+        times = [settings.get(f'{kind}_time_utc') for kind in SCHEDULE_KINDS]
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO users (user_id, data, {', '.join(f'{kind}_time_utc' for kind in SCHEDULE_KINDS)}, last_updated) "
+                f"VALUES (?, ?, {', '.join('?' for _ in SCHEDULE_KINDS)}, ?)",
+                (str(user_id), json.dumps(data), *times, data.get('last_updated'))
+            )
+
+    def _iter_users(self):
+        return [(user_id, json.loads(data)) for user_id, data in self._query("SELECT user_id, data FROM users")]
+
+    def _user_ids_at(self, kind, utc_time_str):
+        if kind not in SCHEDULE_KINDS:
+            raise ValueError(f"Unknown schedule kind {kind}")
+        return [row[0] for row in self._query(f"SELECT user_id FROM users WHERE {kind}_time_utc = ?", (utc_time_str,))]
+
+    def _iter_users_updated_since(self, since):
+        rows = self._query("SELECT user_id, data FROM users WHERE last_updated > ?", (since,))
+        return [(user_id, json.loads(data)) for user_id, data in rows]
+
+    def _latest_update(self):
+        return self._query("SELECT MAX(last_updated) FROM users")[0][0]
+
+    def get_user_snapshots(self, user_ids, chunk_size=500):
+        user_ids = [str(user_id) for user_id in user_ids]
+        snapshots = []
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            try:
+                rows = dict(self._query(
+                    f"SELECT user_id, data FROM users WHERE user_id IN ({', '.join('?' for _ in chunk)})", chunk
+                ))
+                snapshots.extend(UserSnapshot(user_id, json.loads(rows[user_id]) if user_id in rows else {}) for user_id in chunk)
+            except Exception as e:
+                logger.error(f"Error getting user snapshots for {len(chunk)} users: {e}")
+        return snapshots
+
+    def _get_doc(self, collection, key):
+        rows = self._query("SELECT data FROM documents WHERE collection = ? AND key = ?", (collection, str(key)))
+        return json.loads(rows[0][0]) if rows else None
+
+    def _put_doc(self, collection, key, data):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (collection, key, data) VALUES (?, ?, ?)",
+                (collection, str(key), json.dumps(data))
+            )
+
+    def _delete_doc(self, collection, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM documents WHERE collection = ? AND key = ?", (collection, str(key)))
+
+    def _append_history(self, user_id, entry):
+        with self._lock:
+            self._conn.execute("INSERT INTO history (user_id, data) VALUES (?, ?)", (str(user_id), json.dumps(entry)))
@@ -1,69 +1,165 @@
 import logging
-from telegram.ext import ApplicationBuilder
+from telegram.ext import ApplicationBuilder, TypeHandler
 from telegram import Update
+from bot import metrics
+from bot.logs import configure_logging
 from bot.commands import DSABotHandlers
+from bot.scheduling import seconds_until_next_minute
 from datetime import datetime
+import atexit
+import json
 import os
+import asyncio
+import queue
+import threading
 import pytz
 
-import os
-print("FIREBASE_CREDENTIALS_PATH:", os.getenv("FIREBASE_CREDENTIALS_PATH"))
-print("File exists:", os.path.exists(os.getenv("FIREBASE_CREDENTIALS_PATH")))
-
-# Configure logging
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO,
-    handlers=[
-        logging.FileHandler("dsa_bot.log"),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+def run_jobs_only(app):
+    """Run the job queue without polling, for extra scheduler workers."""
+    async def runner():
+        async with app:
+            await app.start()
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await app.stop()
+    try:
+        asyncio.run(runner())
+    except KeyboardInterrupt:
+        logger.info("Scheduler worker stopped.")
+
+class UpdateRecorder:
+    """Write JSONL lines from a background thread so the event loop never waits on the disk."""
+    def __init__(self, path):
+        self._queue = queue.SimpleQueue()
+        self._file = open(path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name="update-recorder", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, line):
+        self._queue.put(line)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            lines = [self._queue.get()]
+            # Drain whatever queued up meanwhile and flush once for the lot.
+            while True:
+                try:
+                    lines.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in lines:
+                stopping = True
+                lines = lines[:lines.index(None)]
+            try:
+                self._file.writelines(lines)
+                self._file.flush()
+            except Exception as e:
+                logger.error(f"Error writing captured updates: {e}")
+        self._file.close()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+def capture_updates(app, path):
+    """Append every incoming update to a JSONL file for later replay."""
+    recorder = UpdateRecorder(path)
+    previous_shutdown = app.post_shutdown
+
+    async def capture(update, context):
+        recorder.put(json.dumps(update.to_dict(), ensure_ascii=False) + "\n")
+
+    async def close_recorder(application):
+        if previous_shutdown:
+            await previous_shutdown(application)
+        await asyncio.to_thread(recorder.close)
+
+    app.add_handler(TypeHandler(Update, capture), group=-1)
+    app.post_shutdown = close_recorder
+    return recorder
+
+def build_application(token, bot_handlers=None, request=None, get_updates_request=None, schedule_jobs=True):
+    """Build the Application with every handler and, optionally, the scheduler jobs."""
+    builder = ApplicationBuilder().token(token)
+    if request is not None:
+        builder = builder.request(request)
+    if get_updates_request is not None:
+        builder = builder.get_updates_request(get_updates_request)
+    app = builder.build()
+    if bot_handlers is None:
+        logger.info("🔧 Initializing DSA Bot Handlers...")
+        bot_handlers = DSABotHandlers()
+
+    update_log_path = os.getenv("UPDATE_LOG_PATH")
+    if update_log_path:
+        capture_updates(app, update_log_path)
+
+    # Register conversation handlers
+    logger.info("📝 Registering conversation handlers...")
+    app.add_handler(bot_handlers.get_conversation_handler())
+    app.add_handler(bot_handlers.get_reminder_conversation_handler())
+
+    # Register other command/callback handlers
+    logger.info("⚙️ Registering command handlers...")
+    for handler in bot_handlers.get_handlers():
+        app.add_handler(handler)
+
+    # Job Schedulers
+    job_queue = app.job_queue
+    if schedule_jobs and job_queue:
+        logger.info("⏰ Setting up job schedulers...")
+        matcher = bot_handlers.question_matcher
+        job_queue.run_repeating(
+            matcher.refresh_catalog_job,
+            interval=matcher.cache_duration, first=0, name="refresh_question_catalog"
+        )
+        # Start just after a minute boundary so each tick sees a whole minute.
+        job_queue.run_repeating(
+            bot_handlers.check_and_send_practice_questions,
+            interval=60, first=seconds_until_next_minute(offset=1), name="practice_questions"
+        )
+        job_queue.run_repeating(
+            bot_handlers.check_and_send_reminders,
+            interval=60, first=seconds_until_next_minute(offset=2), name="completion_reminders"
+        )
+        job_queue.run_repeating(
+            bot_handlers.check_and_auto_mark_missed,
+            interval=60, first=seconds_until_next_minute(offset=3), name="auto_mark_missed"
+        )
+        job_queue.run_once(metrics.start_loop_lag_monitor, when=0, name="loop_lag_monitor")
+        logger.info("✅ All job schedulers started successfully.")
+    return app, bot_handlers
+
 def main():
     """Initialize and run the bot with all schedulers."""
+    configure_logging()
     try:
         token = os.getenv("TELEGRAM_BOT_TOKEN")
         if not token:
             logger.error("TELEGRAM_BOT_TOKEN environment variable not set")
             return
-        
-        app = ApplicationBuilder().token(token).build()
-        logger.info("🔧 Initializing DSA Bot Handlers...")
-        bot_handlers = DSABotHandlers()
 
-        # Register conversation handlers
-        logger.info("📝 Registering conversation handlers...")
-        app.add_handler(bot_handlers.get_conversation_handler())
-        app.add_handler(bot_handlers.get_reminder_conversation_handler())
-
-        # Register other command/callback handlers
-        logger.info("⚙️ Registering command handlers...")
-        for handler in bot_handlers.get_handlers():
-            app.add_handler(handler)
-
-        # Job Schedulers
-        job_queue = app.job_queue
-        if job_queue:
-            logger.info("⏰ Setting up job schedulers...")
-            job_queue.run_repeating(
-                bot_handlers.check_and_send_practice_questions,
-                interval=60, first=10, name="practice_questions"
-            )
-            job_queue.run_repeating(
-                bot_handlers.check_and_send_reminders,
-                interval=60, first=20, name="completion_reminders"
-            )
-            job_queue.run_repeating(
-                bot_handlers.check_and_auto_mark_missed,
-                interval=60, first=30, name="auto_mark_missed"
-            )
-            logger.info("✅ All job schedulers started successfully.")
+        app, bot_handlers = build_application(token)
+        metrics.start_server()
 
         current_time_pkt = datetime.now(pytz.timezone("Asia/Karachi")).strftime("%Y-%m-%d %H:%M:%S")
-        logger.info(f"🚀 DSA Mentor Bot started successfully at {current_time_pkt} PKT")
-        app.run_polling(allowed_updates=Update.ALL_TYPES)
+        shards = bot_handlers.shards
+        # Telegram allows a single getUpdates consumer, so only one worker polls.
+        polling = os.getenv("BOT_POLLING", "1" if shards.worker_id == 0 else "0") == "1"
+        logger.info(
+            f"🚀 DSA Mentor Bot started successfully at {current_time_pkt} PKT "
+            f"(worker {shards.worker_id + 1}/{shards.worker_count}, polling={'on' if polling else 'off'})"
+        )
+        if polling:
+            app.run_polling(allowed_updates=Update.ALL_TYPES)
+        else:
+            run_jobs_only(app)
 
     except Exception as e:
         logger.error(f"❌ Critical error starting bot: {e}", exc_info=True)
@@ -0,0 +1,320 @@
+"""Synthetic load generator and update replayer for the bot's update pipeline.
+
+Drives the Application from dsa_bot.build_application with simulated users
+(or a captured UPDATE_LOG_PATH file) against a local Bot API stub and the
+in-memory storage, then reports handler latency, event-loop lag and throughput.
+
+    python loadtest.py --users 2000 --concurrency 500
+    python loadtest.py --replay updates.jsonl
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import statistics
+import time
+from collections import Counter, defaultdict
+
+# Keep the run local unless the caller explicitly points elsewhere.
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("CATALOG_SOURCE", "memory")
+os.environ.setdefault("CATALOG_OFFLINE", "1")
+
+from telegram import Update
+from telegram.request import BaseRequest
+
+from bot.catalog import QuestionCatalog
+from bot.commands import DSABotHandlers
+from dsa_bot import build_application
+
+logger = logging.getLogger("loadtest")
+
+STUB_TOKEN = "123456:LOADTEST"
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "DSA Mentor", "username": "dsa_mentor_loadtest_bot"}
+FLOW = [
+    ("command", "/start"),
+    ("command", "/setup"),
+    ("text", "Easy, Medium"),
+    ("text", "Array, Tree"),
+    ("text", "Google"),
+    ("command", "/setreminder"),
+    ("text", "9:00 AM"),
+    ("text", "8:00 PM"),
+    ("text", "5:00 PM"),
+    ("command", "/question"),
+    ("command", "/done"),
+    ("callback", "next_question"),
+    ("command", "/missed"),
+    ("callback", "stats"),
+    ("command", "/stats"),
+]
+
+
+class StubBotAPI(BaseRequest):
+    # Answers Bot API calls locally, optionally after a fixed delay, so the
+    # run measures the bot rather than Telegram.
+    def __init__(self, latency=0.0, calls=None):
+        self.latency = latency
+        self.calls = calls if calls is not None else Counter()
+        self._message_ids = itertools.count(1)
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _result(self, method, params):
+        if method == "getMe":
+            return BOT_USER
+        if method in ("sendMessage", "editMessageText"):
+            return {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+                "from": BOT_USER,
+                "text": params.get("text", ""),
+            }
+        if method == "getUpdates":
+            return []
+        return True
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit("/", 1)[-1]
+        self.calls[api_method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = request_data.parameters if request_data else {}
+        return 200, json.dumps({"ok": True, "result": self._result(api_method, params)}).encode()
+
+
+class UpdateFactory:
+    def __init__(self):
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    def _user(self, user_id):
+        return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+
+    def _message(self, user_id, text):
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return message
+
+    def make(self, user_id, kind, payload):
+        update_id = next(self._update_ids)
+        if kind == "callback":
+            return {
+                "update_id": update_id,
+                "callback_query": {
+                    "id": str(update_id),
+                    "from": self._user(user_id),
+                    "chat_instance": str(user_id),
+                    "data": payload,
+                    "message": dict(self._message(user_id, "menu"), **{"from": BOT_USER}),
+                },
+            }
+        return {"update_id": update_id, "message": self._message(user_id, payload)}
+
+
+def synthetic_questions(count, seed=7):
+    rng = random.Random(seed)
+    topics = ["Array", "Binary Tree", "Graph", "String", "Dynamic Programming", "Heap", "Stack", "Linked List"]
+    companies = ["Google", "Amazon", "Microsoft", "Meta", "Apple", "Uber"]
+    return [
+        {
+            "Question": f"Load test problem {i}",
+            "Topics": ", ".join(rng.sample(topics, rng.randint(1, 3))),
+            "Companies": ", ".join(rng.sample(companies, rng.randint(1, 3))),
+            "Difficulty": rng.choice(["Easy", "Medium", "Hard"]),
+        }
+        for i in range(count)
+    ]
+
+
+def synthetic_sessions(users, factory, first_user_id=10_000_000):
+    return {
+        user_id: [factory.make(user_id, kind, payload) for kind, payload in FLOW]
+        for user_id in range(first_user_id, first_user_id + users)
+    }
+
+
+def replay_sessions(path):
+    # One update per line, as written by UPDATE_LOG_PATH. Updates keep their
+    # per-user order; different users run concurrently.
+    sessions = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            source = data.get("message") or data.get("callback_query") or {}
+            sessions[(source.get("from") or {}).get("id", 0)].append(data)
+    return sessions
+
+
+class LoopLagMonitor:
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - started - self.interval))
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run(sessions, concurrency, think_time, api_latency, catalog_size):
+    calls = Counter()
+    bot_handlers = DSABotHandlers()
+    matcher = bot_handlers.question_matcher
+    if matcher.catalog is None:
+        matcher.catalog = QuestionCatalog(synthetic_questions(catalog_size))
+    app, _ = build_application(
+        STUB_TOKEN, bot_handlers=bot_handlers,
+        request=StubBotAPI(api_latency, calls), get_updates_request=StubBotAPI(api_latency, calls),
+        schedule_jobs=False,
+    )
+    errors = Counter()
+
+    async def on_error(update, context):
+        errors[type(context.error).__name__] += 1
+
+    app.add_error_handler(on_error)
+    latencies = defaultdict(list)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def play(updates):
+        async with semaphore:
+            for data in updates:
+                update = Update.de_json(data, app.bot)
+                label = update.callback_query.data if update.callback_query else (update.message.text or "").split()[0]
+                label = label if label.startswith("/") or update.callback_query else "<text>"
+                started = time.perf_counter()
+                await app.process_update(update)
+                latencies[label].append(time.perf_counter() - started)
+                if think_time:
+                    await asyncio.sleep(random.uniform(0, think_time))
+
+    monitor = LoopLagMonitor()
+    async with app:
+        monitor.start()
+        started = time.perf_counter()
+        await asyncio.gather(*(play(updates) for updates in sessions.values()))
+        elapsed = time.perf_counter() - started
+        await monitor.stop()
+    return latencies, monitor.samples, elapsed, calls, errors
+
+
+def report(latencies, lag_samples, elapsed, calls, errors, users):
+    every = [value for values in latencies.values() for value in values]
+    lines = [
+        f"users={users} updates={len(every)} elapsed={elapsed:.2f}s throughput={len(every) / elapsed if elapsed else 0:.1f} updates/s",
+        f"{'handler':<16}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}",
+    ]
+    for label, values in sorted(latencies.items()) + [("all", every)]:
+        lines.append(
+            f"{label:<16}{len(values):>8}{percentile(values, 50) * 1000:>10.2f}"
+            f"{percentile(values, 99) * 1000:>10.2f}{max(values, default=0) * 1000:>10.2f}"
+        )
+    lines.append(
+        f"event loop lag: p50={percentile(lag_samples, 50) * 1000:.2f}ms "
+        f"p99={percentile(lag_samples, 99) * 1000:.2f}ms max={max(lag_samples, default=0) * 1000:.2f}ms"
+    )
+    lines.append("bot api calls: " + ", ".join(f"{name}={count}" for name, count in calls.most_common()))
+    if errors:
+        lines.append("handler errors: " + ", ".join(f"{name}={count}" for name, count in errors.most_common()))
+    return "\n".join(lines)
+
+
+def summary(latencies, lag_samples, elapsed, calls, errors, users):
+    every = [value for values in latencies.values() for value in values]
+
+    def stats(values):
+        return {
+            "count": len(values),
+            "p50_ms": percentile(values, 50) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "mean_ms": statistics.fmean(values) * 1000 if values else 0.0,
+        }
+
+    return {
+        "users": users,
+        "updates": len(every),
+        "elapsed_s": elapsed,
+        "throughput": len(every) / elapsed if elapsed else 0.0,
+        "handlers": {label: stats(values) for label, values in latencies.items()},
+        "all": stats(every),
+        "loop_lag": stats(lag_samples),
+        "api_calls": dict(calls),
+        "errors": dict(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000, help="simulated users (ignored with --replay)")
+    parser.add_argument("--concurrency", type=int, default=200, help="users playing at the same time")
+    parser.add_argument("--think-time", type=float, default=0.0, help="max random pause between a user's updates, seconds")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="simulated Bot API round trip, seconds")
+    parser.add_argument("--catalog-size", type=int, default=375, help="synthetic questions when no snapshot is loaded")
+    parser.add_argument("--replay", help="JSONL file of captured updates (see UPDATE_LOG_PATH)")
+    parser.add_argument("--record", help="write the generated updates to this JSONL file")
+    parser.add_argument("--json", help="write the summary as JSON to this file")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    if args.replay:
+        sessions = replay_sessions(args.replay)
+    else:
+        sessions = synthetic_sessions(args.users, UpdateFactory())
+    if args.record:
+        with open(args.record, "w", encoding="utf-8") as f:
+            for updates in sessions.values():
+                for data in updates:
+                    f.write(json.dumps(data) + "\n")
+
+    results = asyncio.run(run(sessions, args.concurrency, args.think_time, args.api_latency, args.catalog_size))
+    print(report(*results, users=len(sessions)))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary(*results, users=len(sessions)), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
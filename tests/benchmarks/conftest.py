@@ -0,0 +1,52 @@
+import asyncio
+import logging
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+pytest.importorskip("telegram")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# Never reach for Firestore or Google Sheets from a benchmark.
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("CATALOG_SOURCE", "memory")
+os.environ.setdefault("CATALOG_OFFLINE", "1")
+
+from bot.catalog import QuestionCatalog
+from bot.storage import MemoryStorage
+
+from support import make_questions
+
+
+@pytest.fixture(autouse=True)
+def quiet_logs():
+    logging.disable(logging.INFO)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def catalogs():
+    cache = {}
+
+    def get(size):
+        if size not in cache:
+            cache[size] = QuestionCatalog(make_questions(size))
+        return cache[size]
+
+    return get
+
+
+@pytest.fixture
+def new_storage():
+    return MemoryStorage
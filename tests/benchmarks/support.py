@@ -0,0 +1,107 @@
+import random
+from datetime import datetime, timedelta
+
+from bot.commands import DSABotHandlers
+from bot.delivery import DeliveryEngine
+from bot.models import AsyncFirebaseManager, DSAQuestionMatcher
+from bot.scheduling import MinuteCursor
+from bot.sources import MemoryCatalogSource
+
+TOPICS = [
+    "Array", "Linked List", "Binary Tree", "Graph", "String", "Dynamic Programming",
+    "Heap (Priority Queue)", "Stack", "Queue", "Hash Table", "Two Pointers", "Sliding Window",
+]
+COMPANIES = ["Google", "Amazon", "Microsoft", "Meta", "Apple", "Netflix", "Uber", "Adobe"]
+DIFFICULTIES = ["Easy", "Medium", "Hard"]
+PROFILES = [
+    {"difficulty": ["Random"], "topic": ["Random"], "company": ["Random"]},
+    {"difficulty": ["Easy", "Medium"], "topic": ["Array"], "company": ["Google"]},
+    {"difficulty": ["Medium"], "topic": ["Tree", "Graph"], "company": ["No preference"]},
+    {"difficulty": ["Hard"], "topic": ["Dynamic Programming"], "company": ["Facebook", "Amazon"]},
+]
+
+
+def make_questions(count, seed=7):
+    rng = random.Random(seed)
+    return [
+        {
+            "Question": f"Synthetic problem {i}",
+            "Topics": ", ".join(rng.sample(TOPICS, rng.randint(1, 3))),
+            "Companies": ", ".join(rng.sample(COMPANIES, rng.randint(0, 3))),
+            "Difficulty": rng.choice(DIFFICULTIES),
+        }
+        for i in range(count)
+    ]
+
+
+def seed_users(storage, count, minute=None, history=0, catalog=None, seed=11):
+    # Users spread over the profiles above; all scheduled in the same minute
+    # bucket when one is given, with `history` answered questions each.
+    rng = random.Random(seed)
+    questions = catalog.questions if catalog else []
+    settings = {"timezone": "Asia/Karachi"}
+    if minute is not None:
+        hhmm = minute.strftime("%H:%M")
+        settings.update(practice_time_utc=hhmm, reminder_time_utc=hhmm, deadline_time_utc=hhmm)
+    for user_id in range(1, count + 1):
+        storage.set_user_prefs(user_id, PROFILES[user_id % len(PROFILES)])
+        storage.set_user_reminder_settings(user_id, dict(settings))
+        for question in rng.sample(questions, min(history, len(questions))):
+            storage._apply_question_status(user_id, question, rng.choice(["done", "missed"]), "2026-01-01")
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent += 1
+
+
+class FakeContext:
+    def __init__(self, bot=None):
+        self.bot = bot or FakeBot()
+        self.user_data = {}
+
+
+class FakeMessage:
+    def __init__(self, text=""):
+        self.text = text
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+    async def reply_html(self, text, **kwargs):
+        self.replies.append(text)
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+
+
+class FakeUpdate:
+    def __init__(self, user_id, text=""):
+        self.effective_user = FakeUser(user_id)
+        self.effective_message = FakeMessage(text)
+        self.message = self.effective_message
+        self.callback_query = None
+
+
+def make_handlers(storage, catalog):
+    firebase = AsyncFirebaseManager(storage, max_workers=8)
+    matcher = DSAQuestionMatcher(firebase, MemoryCatalogSource())
+    matcher.catalog = catalog
+    # Measure our own overhead, not Telegram's rate limits.
+    delivery = DeliveryEngine(max_concurrency=256, global_rate=1e9, per_chat_interval=0)
+    return DSABotHandlers(firebase, matcher, delivery)
+
+
+def previous_minute():
+    return datetime.utcnow().replace(second=0, microsecond=0) - timedelta(minutes=1)
+
+
+def prime_cursor(handlers, kind, minute):
+    # The next tick then processes exactly `minute` (and the current one).
+    handlers.cursors[kind] = MinuteCursor(minute - timedelta(minutes=1))
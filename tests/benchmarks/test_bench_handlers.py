@@ -0,0 +1,42 @@
+import pytest
+
+from support import FakeContext, FakeUpdate, make_handlers, seed_users
+
+USERS = 1_000
+
+
+@pytest.fixture
+def handlers(catalogs, new_storage):
+    catalog = catalogs(10_000)
+    storage = new_storage()
+    seed_users(storage, USERS, history=50, catalog=catalog)
+    return make_handlers(storage, catalog)
+
+
+def test_question_command(benchmark, loop, handlers):
+    context = FakeContext()
+    update = FakeUpdate(1)
+    benchmark(lambda: loop.run_until_complete(handlers.question_command(update, context)))
+    assert update.effective_message.replies
+
+
+def test_done_command(benchmark, loop, handlers):
+    context = FakeContext()
+    user_ids = iter(range(1, USERS + 1))
+
+    def setup():
+        user_id = next(user_ids)
+        loop.run_until_complete(handlers.question_command(FakeUpdate(user_id), context))
+        return (FakeUpdate(user_id),), {}
+
+    benchmark.pedantic(
+        lambda update: loop.run_until_complete(handlers.done_command(update, context)),
+        setup=setup, rounds=200,
+    )
+
+
+def test_stats_command(benchmark, loop, handlers):
+    context = FakeContext()
+    update = FakeUpdate(1)
+    benchmark(lambda: loop.run_until_complete(handlers.stats_command(update, context)))
+    assert "Your Stats" in update.effective_message.replies[-1]
@@ -0,0 +1,40 @@
+import pytest
+
+from support import PROFILES, make_handlers, seed_users
+
+CATALOG_SIZES = [375, 10_000, 100_000]
+HISTORY_SIZES = [0, 100, 1_000]
+
+
+@pytest.mark.parametrize("history", HISTORY_SIZES)
+@pytest.mark.parametrize("catalog_size", CATALOG_SIZES)
+def test_get_matching_questions(benchmark, loop, catalogs, new_storage, catalog_size, history):
+    catalog = catalogs(catalog_size)
+    storage = new_storage()
+    seed_users(storage, len(PROFILES), history=history, catalog=catalog)
+    matcher = make_handlers(storage, catalog).question_matcher
+    user_ids = list(range(1, len(PROFILES) + 1))
+
+    def match_all():
+        for user_id in user_ids:
+            loop.run_until_complete(matcher.get_matching_questions(user_id))
+
+    benchmark.extra_info.update(catalog_size=catalog_size, history=history, users=len(user_ids))
+    benchmark(match_all)
+
+
+@pytest.mark.parametrize("history", HISTORY_SIZES)
+@pytest.mark.parametrize("catalog_size", CATALOG_SIZES)
+def test_pick_question(benchmark, loop, catalogs, new_storage, catalog_size, history):
+    catalog = catalogs(catalog_size)
+    storage = new_storage()
+    seed_users(storage, len(PROFILES), history=history, catalog=catalog)
+    matcher = make_handlers(storage, catalog).question_matcher
+    user_ids = list(range(1, len(PROFILES) + 1))
+
+    def pick_all():
+        for user_id in user_ids:
+            loop.run_until_complete(matcher.pick_question(user_id))
+
+    benchmark.extra_info.update(catalog_size=catalog_size, history=history, users=len(user_ids))
+    benchmark(pick_all)
@@ -0,0 +1,28 @@
+import pytest
+
+from support import FakeContext, make_handlers, previous_minute, prime_cursor, seed_users
+
+USER_COUNTS = [1_000, 10_000, 100_000]
+
+
+@pytest.mark.parametrize("users", USER_COUNTS)
+def test_practice_tick(benchmark, loop, catalogs, new_storage, users):
+    catalog = catalogs(375)
+    minute = previous_minute()
+    storage = new_storage()
+    seed_users(storage, users, minute=minute)
+
+    def setup():
+        # Fresh handlers each round so the delivery ledger starts empty.
+        storage._docs = {key: doc for key, doc in storage._docs.items() if key[0] != 'delivery_ledger'}
+        handlers = make_handlers(storage, catalog)
+        prime_cursor(handlers, 'practice', minute)
+        context = FakeContext()
+        return (handlers, context), {}
+
+    def tick(handlers, context):
+        loop.run_until_complete(handlers.check_and_send_practice_questions(context))
+        assert context.bot.sent == users
+
+    benchmark.extra_info.update(users=users)
+    benchmark.pedantic(tick, setup=setup, rounds=3 if users < 100_000 else 1)
@@ -0,0 +1,23 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Unit tests run against the local backends only.
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("CATALOG_SOURCE", "memory")
+os.environ.setdefault("CATALOG_OFFLINE", "1")
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--run-benchmarks", action="store_true", default=False,
+        help="also collect tests/benchmarks (skipped by default; the large fixtures take minutes to build)",
+    )
+
+
+def pytest_ignore_collect(collection_path, config):
+    # Benchmarks are opt-in so a plain `pytest` run stays fast.
+    if collection_path.name == "benchmarks" and not config.getoption("--run-benchmarks"):
+        return True
+    return None
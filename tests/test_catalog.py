@@ -0,0 +1,209 @@
+import pytest
+
+from bot.catalog import (
+    ProfileCache, QuestionCatalog, QuestionSampler, company_terms, profile_key, question_id_for, split_tags, topic_terms,
+)
+
+
+def row(title, topics, companies="", difficulty="Easy"):
+    return {"Question": title, "Topics": topics, "Companies": companies, "Difficulty": difficulty}
+
+
+def matching_titles(catalog, topic=("Random",), company=("Random",), difficulty=("Random",)):
+    prefs = {"difficulty": list(difficulty), "topic": list(topic), "company": list(company)}
+    return sorted(question["Question"] for question in catalog.index.match(prefs))
+
+
+@pytest.mark.parametrize("cell, expected", [
+    ("Arrays, Strings", ["array", "string"]),
+    ("Stacks & Queues", ["stack", "queue"]),
+    ("Stacks and Queues", ["stack", "queue"]),
+    ("Divide and Conquer", ["divide and conquer"]),
+    ("2D Arrays", ["matrix", "array"]),
+    ("Tries", ["trie"]),
+    ("Queries", ["query"]),
+    ("DP", ["dynamic programming"]),
+    ("Heap (Priority Queue)", ["heap"]),
+    ("Binary Search Tree", ["binary search tree", "binary tree", "tree"]),
+])
+def test_topic_terms(cell, expected):
+    assert topic_terms(cell) == expected
+
+
+@pytest.mark.parametrize("cell, expected", [
+    ("Amazon & Google", ["amazon", "google"]),
+    ("Facebook, AWS", ["meta", "amazon"]),
+    ("AT&T", ["at&t"]),
+])
+def test_company_terms(cell, expected):
+    assert company_terms(cell) == expected
+
+
+def test_split_tags_ignores_empty_parts():
+    assert split_tags("Array,, / String;") == ["array", "string"]
+    assert split_tags(None) == []
+
+
+def test_array_does_not_match_subarray():
+    catalog = QuestionCatalog([row("Plain", "Array"), row("Window", "Subarray")])
+    assert matching_titles(catalog, topic=["Array"]) == ["Plain"]
+
+
+def test_tree_does_not_match_trie():
+    catalog = QuestionCatalog([row("Trie", "Tries"), row("Tree", "Binary Tree")])
+    assert matching_titles(catalog, topic=["Tree"]) == ["Tree"]
+    assert matching_titles(catalog, topic=["Trie"]) == ["Trie"]
+
+
+def test_combined_cells_match_each_topic():
+    catalog = QuestionCatalog([row("Both", "Stacks & Queues"), row("Grid", "2D Arrays")])
+    assert matching_titles(catalog, topic=["Stack"]) == ["Both"]
+    assert matching_titles(catalog, topic=["Queue"]) == ["Both"]
+    assert matching_titles(catalog, topic=["Array"]) == ["Grid"]
+
+
+def test_spellings_share_one_tag():
+    catalog = QuestionCatalog([
+        row("One", "Dynamic Programming", "Facebook"),
+        row("Two", "DP", "Meta & Google"),
+    ])
+    assert matching_titles(catalog, topic=["Dynamic Programming"], company=["Facebook"]) == ["One", "Two"]
+    assert matching_titles(catalog, company=["Google"]) == ["Two"]
+
+
+def test_diff_reports_added_removed_and_changed_rows():
+    catalog = QuestionCatalog([row("Keep", "Array"), row("Edit", "Array"), row("Drop", "Graph")], revision="r1")
+    diff = catalog.diff([row("Keep", "Array"), row("Edit", "Graph"), row("New", "Heap")], revision="r2")
+    assert sorted(q["Question"] for q in diff.added.values()) == ["New"]
+    assert sorted(q["Question"] for q in diff.changed.values()) == ["Edit"]
+    assert len(diff.removed) == 1
+    assert str(diff) == "+1 -1 ~1"
+
+
+def test_apply_matches_a_fresh_load():
+    rows = [row("Keep", "Array"), row("Edit", "Graph", difficulty="Hard"), row("New", "Heap")]
+    catalog = QuestionCatalog([row("Keep", "Array"), row("Edit", "Array"), row("Drop", "Graph")], revision="r1")
+    catalog.apply(catalog.diff(rows, revision="r2"))
+    fresh = QuestionCatalog(rows, revision="r2")
+    assert catalog.version == fresh.version
+    assert catalog.revision == "r2"
+    assert [q["Question"] for q in catalog.questions] == ["Keep", "Edit", "New"]
+    assert matching_titles(catalog, topic=["Graph"]) == ["Edit"]
+    assert matching_titles(catalog, topic=["Array"]) == ["Keep"]
+    assert matching_titles(catalog, difficulty=["Hard"]) == ["Edit"]
+
+
+def test_empty_diff_keeps_the_version():
+    catalog = QuestionCatalog([row("Keep", "Array")], revision="r1")
+    version = catalog.version
+    diff = catalog.diff([row("Keep", "Array")], revision="r2")
+    assert not diff
+    catalog.apply(diff)
+    assert catalog.version == version
+    assert catalog.revision == "r2"
+
+
+RANDOM_PREFS = {"difficulty": ["Random"], "topic": ["Random"], "company": ["Random"]}
+
+
+class CountingSet(set):
+    checks = 0
+
+    def __contains__(self, item):
+        CountingSet.checks += 1
+        return super().__contains__(item)
+
+
+def sampler_catalog(size=60):
+    return QuestionCatalog([row(f"Problem {i}", "Array", difficulty=("Easy", "Medium", "Hard")[i % 3]) for i in range(size)])
+
+
+def test_sampler_serves_the_whole_pool_without_repeats():
+    catalog = sampler_catalog()
+    sampler = QuestionSampler()
+    served = CountingSet()
+    CountingSet.checks = 0
+    order = []
+    while (question := sampler.draw(catalog, RANDOM_PREFS, served, key=1)) is not None:
+        order.append(question_id_for(question))
+        served.add(order[-1])
+    assert len(order) == len(served) == len(catalog)
+    # Each draw continues the user's walk; only the final exhaustion check
+    # rescans the pool.
+    assert CountingSet.checks == 2 * len(catalog)
+
+
+def test_sampler_only_returns_pending_questions_once_the_pool_is_served():
+    catalog = sampler_catalog(30)
+    sampler = QuestionSampler()
+    ids = [question_id_for(question) for question in catalog.questions]
+    answered, pending = set(ids[:25]), set(ids[25:])
+    sampler.draw(catalog, RANDOM_PREFS, answered | pending, key=1)
+    assert sampler.draw(catalog, RANDOM_PREFS, answered | pending, key=1) is None
+    for _ in range(20):
+        assert question_id_for(sampler.draw(catalog, RANDOM_PREFS, answered, key=1)) in pending
+
+
+def test_sampler_finds_a_withdrawn_question_again():
+    catalog = sampler_catalog(9)
+    sampler = QuestionSampler()
+    withdrawn = question_id_for(sampler.draw(catalog, RANDOM_PREFS, set(), key=1))
+    served = set()
+    while (question := sampler.draw(catalog, RANDOM_PREFS, served, key=1)) is not None:
+        served.add(question_id_for(question))
+    assert withdrawn in served
+    assert len(served) == len(catalog)
+
+
+def test_sampler_respects_difficulty_weights():
+    catalog = sampler_catalog(30)
+    sampler = QuestionSampler(weights={"Easy": 1.0, "Medium": 0.0, "Hard": 0.0})
+    for _ in range(20):
+        assert sampler.draw(catalog, RANDOM_PREFS)["Difficulty"] == "Easy"
+
+
+def prefs(topic=("Random",), company=("Random",), difficulty=("Random",)):
+    return {"difficulty": list(difficulty), "topic": list(topic), "company": list(company)}
+
+
+def test_equivalent_spellings_have_one_profile_key():
+    assert profile_key(prefs(topic=["Arrays", "Strings"])) == profile_key(prefs(topic=["string", "Array"]))
+    assert profile_key(prefs(company=["Facebook"])) == profile_key(prefs(company=["Meta"]))
+    assert profile_key(prefs(company=["No preference"])) == profile_key(prefs())
+    assert profile_key(prefs(difficulty=["Easy ", "Hard"])) == profile_key(prefs(difficulty=["Hard", "Easy"]))
+    assert profile_key(prefs(topic=["Array"])) != profile_key(prefs(topic=["Subarray"]))
+
+
+def test_equivalent_spellings_share_one_pool():
+    catalog = QuestionCatalog([row("Two Sum", "Arrays", "Facebook"), row("Valid Parentheses", "Stack", "Amazon")])
+    cache = ProfileCache()
+    pool = cache.get(catalog, prefs(topic=["Arrays"], company=["Facebook"]))
+    assert cache.get(catalog, prefs(topic=["array"], company=["Meta"])) is pool
+    assert (cache.hits, cache.misses, len(cache)) == (1, 1, 1)
+    assert len(pool.ids) == 1
+
+
+def test_profile_cache_evicts_the_least_recently_used_pool():
+    catalog = QuestionCatalog([row("Two Sum", "Array"), row("Valid Parentheses", "Stack"), row("Merge Intervals", "Sorting")])
+    cache = ProfileCache(capacity=2)
+    array_pool = cache.get(catalog, prefs(topic=["Array"]))
+    stack_pool = cache.get(catalog, prefs(topic=["Stack"]))
+    assert cache.get(catalog, prefs(topic=["Array"])) is array_pool
+    cache.get(catalog, prefs(topic=["Sorting"]))
+    assert len(cache) == 2
+    assert cache.get(catalog, prefs(topic=["Array"])) is array_pool
+    assert cache.get(catalog, prefs(topic=["Stack"])) is not stack_pool
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_catalog_version_bump_misses_the_old_pool():
+    catalog = QuestionCatalog([row("Two Sum", "Array")])
+    cache = ProfileCache()
+    old_pool = cache.get(catalog, prefs(topic=["Array"]))
+    old_version = catalog.version
+    catalog.apply(catalog.diff([row("Two Sum", "Array"), row("Rotate Array", "Array")]))
+    assert catalog.version != old_version
+    new_pool = cache.get(catalog, prefs(topic=["Array"]))
+    assert new_pool is not old_pool
+    assert (len(old_pool.ids), len(new_pool.ids)) == (1, 2)
+    assert (cache.hits, cache.misses) == (0, 2)
@@ -0,0 +1,192 @@
+import asyncio
+import types
+
+import pytest
+
+pytest.importorskip("telegram")
+pytest.importorskip("firebase_admin")
+pytest.importorskip("gspread")
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from bot.delivery import Delivery, DeliveryEngine, DeliveryLedger, TokenBucket
+from bot.models import AsyncFirebaseManager
+from bot.storage import MemoryStorage
+
+
+def ledger_on(storage):
+    return DeliveryLedger(AsyncFirebaseManager(storage, max_workers=2))
+
+
+def test_claim_is_granted_once_per_user_kind_and_date():
+    ledger = ledger_on(MemoryStorage())
+
+    async def run():
+        return [
+            await ledger.claim(1, "practice", "2026-03-01"),
+            await ledger.claim(1, "practice", "2026-03-01"),
+            await ledger.claim(1, "reminder", "2026-03-01"),
+            await ledger.claim(2, "practice", "2026-03-01"),
+            await ledger.claim(1, "practice", "2026-03-02"),
+        ]
+
+    assert asyncio.run(run()) == [True, False, True, True, True]
+
+
+def test_claims_are_shared_through_storage():
+    storage = MemoryStorage()
+
+    async def run():
+        first = await ledger_on(storage).claim(1, "deadline", "2026-03-01")
+        second = await ledger_on(storage).claim(1, "deadline", "2026-03-01")
+        return first, second
+
+    assert asyncio.run(run()) == (True, False)
+
+
+def test_released_claim_can_be_taken_again():
+    storage = MemoryStorage()
+    ledger = ledger_on(storage)
+
+    async def run():
+        await ledger.claim(1, "deadline", "2026-03-01")
+        await ledger.release(1, "deadline", "2026-03-01")
+        return await ledger.claim(1, "deadline", "2026-03-01"), await ledger_on(storage).claim(1, "deadline", "2026-03-01")
+
+    assert asyncio.run(run()) == (True, False)
+
+
+def test_unknown_claim_outcome_is_reported_and_not_remembered():
+    class Flaky(MemoryStorage):
+        fail = True
+
+        def claim_delivery(self, user_id, kind, date_str):
+            if self.fail:
+                return None
+            return super().claim_delivery(user_id, kind, date_str)
+
+    storage = Flaky()
+    ledger = ledger_on(storage)
+
+    async def run():
+        first = await ledger.claim(1, "practice", "2026-03-01")
+        storage.fail = False
+        return first, await ledger.claim(1, "practice", "2026-03-01")
+
+    assert asyncio.run(run()) == (None, True)
+
+
+def test_only_recent_dates_are_kept_in_memory():
+    ledger = DeliveryLedger(None, days_kept=2)
+    for day in ("2026-03-01", "2026-03-02", "2026-03-03"):
+        ledger._remember(1, "practice", day)
+    assert not ledger.seen(1, "practice", "2026-03-01")
+    assert ledger.seen(1, "practice", "2026-03-03")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        # A real sleep always lets some time pass, however small the request.
+        self.sleeps.append(seconds)
+        self.now += max(seconds, 1e-6)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr("bot.delivery.time", types.SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr("bot.delivery.asyncio", types.SimpleNamespace(
+        sleep=clock.sleep, Lock=asyncio.Lock, Semaphore=asyncio.Semaphore, gather=asyncio.gather,
+    ))
+    return clock
+
+
+class FakeBot:
+    # Each chat fails with its queued errors in order, then succeeds.
+    def __init__(self, errors=None):
+        self.errors = {chat_id: list(queued) for chat_id, queued in (errors or {}).items()}
+        self.calls = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls.append(chat_id)
+        queued = self.errors.get(chat_id)
+        if queued:
+            raise queued.pop(0)
+
+
+def deliver(bot, chat_ids, **options):
+    options.setdefault("global_rate", 1000)
+    options.setdefault("per_chat_interval", 0)
+    engine = DeliveryEngine(max_concurrency=1, **options)
+    return asyncio.run(engine.deliver(bot, [Delivery(chat_id, "hi") for chat_id in chat_ids], "test"))
+
+
+def test_retry_after_pauses_every_sender_then_retries(clock):
+    bot = FakeBot({1: [RetryAfter(5)]})
+    report = deliver(bot, [1, 2])
+    assert (report.sent, report.failed, report.retries) == (2, 0, 1)
+    assert report.errors == {"RetryAfter": 1}
+    assert bot.calls == [1, 1, 2]
+    assert sum(clock.sleeps) >= 5
+
+
+def test_network_errors_back_off_and_give_up_after_max_retries(clock):
+    bot = FakeBot({1: [NetworkError("down")] * 5})
+    report = deliver(bot, [1], max_retries=2)
+    assert (report.sent, report.failed, report.retries) == (0, 1, 2)
+    assert report.errors == {"NetworkError": 3}
+    assert report.failed_chats == [1]
+    assert clock.sleeps == [1.0, 2.0]
+
+
+def test_network_error_then_success_counts_one_retry(clock):
+    report = deliver(FakeBot({1: [NetworkError("blip")]}), [1])
+    assert (report.sent, report.failed, report.retries) == (1, 0, 1)
+
+
+def test_retry_after_gives_up_after_max_retries(clock):
+    bot = FakeBot({1: [RetryAfter(1)] * 5})
+    report = deliver(bot, [1], max_retries=1)
+    assert (report.sent, report.failed, report.retries) == (0, 1, 1)
+    assert report.errors == {"RetryAfter": 2}
+    assert len(bot.calls) == 2
+
+
+def test_permanent_errors_are_not_retried(clock):
+    bot = FakeBot({1: [BadRequest("chat not found")], 2: [Forbidden("bot was blocked")], 3: [ValueError("bug")]})
+    report = deliver(bot, [1, 2, 3, 4])
+    assert (report.sent, report.failed, report.retries) == (1, 3, 0)
+    assert report.errors == {"BadRequest": 1, "Forbidden": 1, "ValueError": 1}
+    assert report.failed_chats == [1, 2, 3]
+    assert bot.calls == [1, 2, 3, 4]
+
+
+def test_messages_to_one_chat_are_spaced_out(clock):
+    deliver(FakeBot(), [1, 1, 1], per_chat_interval=1.0)
+    assert clock.now - 1000.0 == pytest.approx(2.0, abs=1e-3)
+
+
+def test_token_bucket_allows_a_burst_then_throttles_to_its_rate(clock):
+    bucket = TokenBucket(rate=10)
+
+    async def run():
+        for _ in range(30):
+            await bucket.acquire()
+
+    asyncio.run(run())
+    # The first 10 tokens are already there; the other 20 arrive at 10/s.
+    assert clock.now - 1000.0 == pytest.approx(2.0, abs=1e-3)
+
+
+def test_paused_token_bucket_waits_out_the_pause(clock):
+    bucket = TokenBucket(rate=10)
+    bucket.pause(3)
+    asyncio.run(bucket.acquire())
+    assert clock.now - 1000.0 == pytest.approx(3.0, abs=1e-3)
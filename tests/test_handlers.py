@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("telegram")
+pytest.importorskip("firebase_admin")
+pytest.importorskip("gspread")
+
+from bot.catalog import QuestionCatalog
+from bot.commands import DSABotHandlers
+from bot.delivery import DeliveryEngine
+from bot.models import AsyncFirebaseManager, DSAQuestionMatcher
+from bot.sources import MemoryCatalogSource
+from bot.storage import MemoryStorage
+
+PREFS = {"difficulty": ["Random"], "topic": ["Random"], "company": ["Random"]}
+QUESTIONS = [{"Question": f"Problem {i}", "Topics": "Array", "Companies": "Google", "Difficulty": "Easy"} for i in range(5)]
+
+
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+    async def reply_html(self, text, **kwargs):
+        self.replies.append(text)
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+
+
+class FakeUpdate:
+    def __init__(self, user_id):
+        self.effective_user = FakeUser(user_id)
+        self.effective_message = FakeMessage()
+
+
+def make_handlers(storage):
+    storage.set_user_prefs(1, PREFS)
+    firebase = AsyncFirebaseManager(storage, max_workers=2)
+    matcher = DSAQuestionMatcher(firebase, MemoryCatalogSource())
+    matcher.catalog = QuestionCatalog(QUESTIONS)
+    return DSABotHandlers(firebase, matcher, DeliveryEngine(global_rate=1e9, per_chat_interval=0))
+
+
+def run(handlers, command):
+    update = FakeUpdate(1)
+    asyncio.run(getattr(handlers, command)(update, None))
+    return update.effective_message.replies[-1]
+
+
+def test_question_is_assigned_and_resolved_once():
+    storage = MemoryStorage()
+    handlers = make_handlers(storage)
+    assert run(handlers, "question_command").startswith("Question: Problem")
+    assert storage.get_active_question(1)
+    assert len(storage.get_user_progress(1)["pending"]) == 1
+    assert run(handlers, "done_command") == "Question marked as done!"
+    assert run(handlers, "done_command") == "No active question found."
+    assert len(storage.get_user_progress(1)["done"]) == 1
+
+
+def test_question_is_not_sent_when_it_cannot_be_saved():
+    class Unavailable(MemoryStorage):
+        def _write_active_question(self, user_id, question):
+            raise RuntimeError("storage unavailable")
+
+    storage = Unavailable()
+    handlers = make_handlers(storage)
+    assert run(handlers, "question_command") == "Could not save your question, please try /question again."
+    assert storage.get_active_question(1) is None
+    assert run(handlers, "done_command") == "No active question found."
+
+
+def test_unknown_claim_outcome_is_retried_next_tick():
+    from datetime import datetime
+
+    from bot.storage import UserSnapshot
+
+    class Flaky(MemoryStorage):
+        def claim_delivery(self, user_id, kind, date_str):
+            if user_id == 2:
+                return None
+            return super().claim_delivery(user_id, kind, date_str)
+
+    storage = Flaky()
+    storage.claim_delivery(3, "practice", "2026-03-01")
+    handlers = make_handlers(storage)
+    minute = datetime(2026, 3, 1, 9, 0)
+    snapshots = [UserSnapshot(user_id) for user_id in (1, 2, 3)]
+    claimed = asyncio.run(handlers.claim_deliveries("practice", minute, snapshots))
+    assert [s.user_id for s in claimed] == [1]
+    assert handlers.retry_users["practice"] == {minute: {2}}
+    assert handlers.tick_counts["practice"]["claim_retry"] == 1
+    assert handlers.tick_counts["practice"]["already_handled"] == 1
+
+
+def test_captured_updates_are_written_and_closed_on_shutdown(tmp_path):
+    from telegram.ext import ApplicationBuilder
+    from dsa_bot import capture_updates
+
+    app = ApplicationBuilder().token("123:TEST").build()
+    path = tmp_path / "updates.jsonl"
+    recorder = capture_updates(app, str(path))
+    for i in range(3):
+        recorder.put(f'{{"update_id": {i}}}\n')
+    asyncio.run(app.post_shutdown(app))
+    assert path.read_text().splitlines() == ['{"update_id": 0}', '{"update_id": 1}', '{"update_id": 2}']
+    assert recorder._file.closed
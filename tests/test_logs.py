@@ -0,0 +1,44 @@
+import json
+import logging
+
+from bot.logs import JsonFormatter, SamplingFilter
+
+
+def emit(log_filter, level, count, lineno=10):
+    passed = []
+    for i in range(count):
+        record = logging.LogRecord("bot.commands", level, "commands.py", lineno, f"line {i}", (), None)
+        if log_filter.filter(record):
+            passed.append(record)
+    return passed
+
+
+def test_routine_lines_are_capped_per_call_site():
+    log_filter = SamplingFilter(burst=3, window=60)
+    assert len(emit(log_filter, logging.INFO, 10)) == 3
+    assert len(emit(log_filter, logging.INFO, 10, lineno=11)) == 3
+
+
+def test_warnings_and_errors_are_never_dropped():
+    log_filter = SamplingFilter(burst=3, window=60)
+    assert len(emit(log_filter, logging.ERROR, 100)) == 100
+    assert len(emit(log_filter, logging.WARNING, 100, lineno=11)) == 100
+
+
+def test_next_line_after_the_window_reports_the_dropped_count(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("bot.logs.time.monotonic", lambda: clock[0])
+    log_filter = SamplingFilter(burst=2, window=60)
+    assert len(emit(log_filter, logging.INFO, 7)) == 2
+    clock[0] += 60
+    record = emit(log_filter, logging.INFO, 1)[0]
+    assert record.suppressed == 5
+
+
+def test_json_formatter_keeps_extra_fields():
+    record = logging.LogRecord("bot.commands", logging.INFO, "commands.py", 1, "tick %s", ("done",), None)
+    record.counts = {"sent": 3}
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["msg"] == "tick done"
+    assert entry["level"] == "INFO"
+    assert entry["counts"] == {"sent": 3}
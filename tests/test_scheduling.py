@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta
+
+import pytz
+
+from bot.scheduling import MinuteCursor, ScheduleIndex, local_date
+
+NOW = datetime(2026, 3, 1, 9, 30, 42)
+CURRENT = datetime(2026, 3, 1, 9, 30)
+
+
+def test_fresh_cursor_processes_only_the_current_minute():
+    assert MinuteCursor().due_minutes(NOW) == [CURRENT]
+
+
+def test_up_to_date_cursor_has_nothing_due():
+    assert MinuteCursor(CURRENT).due_minutes(NOW) == []
+
+
+def test_missed_minutes_are_caught_up_in_order():
+    cursor = MinuteCursor(CURRENT - timedelta(minutes=3))
+    assert cursor.due_minutes(NOW) == [CURRENT - timedelta(minutes=2), CURRENT - timedelta(minutes=1), CURRENT]
+
+
+def test_catch_up_is_capped_per_tick():
+    cursor = MinuteCursor(CURRENT - timedelta(minutes=40), max_per_tick=15)
+    due = cursor.due_minutes(NOW)
+    assert len(due) == 15
+    assert due[0] == CURRENT - timedelta(minutes=39)
+
+
+def test_minutes_older_than_the_catch_up_window_are_dropped():
+    cursor = MinuteCursor(CURRENT - timedelta(days=1), max_catchup=5, max_per_tick=100)
+    assert cursor.due_minutes(NOW) == [CURRENT - timedelta(minutes=m) for m in range(4, -1, -1)]
+
+
+def test_advance_never_moves_backwards():
+    cursor = MinuteCursor(CURRENT)
+    cursor.advance(CURRENT - timedelta(minutes=5))
+    assert cursor.last == CURRENT
+    cursor.advance(CURRENT + timedelta(minutes=1))
+    assert cursor.last == CURRENT + timedelta(minutes=1)
+
+
+def test_serialize_round_trips():
+    cursor = MinuteCursor(CURRENT)
+    assert MinuteCursor.parse(cursor.serialize()) == CURRENT
+    assert MinuteCursor.parse('') is None
+    assert MinuteCursor().serialize() == ''
+
+
+def utc_settings(tz_name, day=datetime(2026, 3, 1), **local_times):
+    # What /setreminder stores: each local HH:MM converted to UTC, plus the timezone.
+    tz = pytz.timezone(tz_name)
+    settings = {"timezone": tz_name}
+    for kind, hhmm in local_times.items():
+        local = tz.localize(datetime.combine(day.date(), datetime.strptime(hhmm, "%H:%M").time()))
+        settings[f"{kind}_time_utc"] = local.astimezone(pytz.UTC).strftime("%H:%M")
+    return settings
+
+
+def test_load_buckets_users_by_utc_minute_per_kind():
+    index = ScheduleIndex()
+    assert not index.loaded
+    index.load({
+        1: {"practice_time_utc": "09:00", "deadline_time_utc": "18:00"},
+        2: {"practice_time_utc": "09:00"},
+        3: {"reminder_time_utc": "not a time"},
+    })
+    assert index.loaded
+    assert len(index) == 2
+    assert sorted(index.users_at("practice", "09:00")) == [1, 2]
+    assert index.users_at("practice", 9 * 60) == index.users_at("practice", "09:00")
+    assert index.users_at("deadline", "18:00") == [1]
+    assert index.users_at("reminder", "09:00") == []
+    assert index.users_at("practice", "24:00") == []
+
+
+def test_load_replaces_the_previous_contents():
+    index = ScheduleIndex()
+    index.load({1: {"practice_time_utc": "09:00"}})
+    index.load({2: {"practice_time_utc": "10:00"}})
+    assert index.users_at("practice", "09:00") == []
+    assert index.users_at("practice", "10:00") == [2]
+    assert len(index) == 1
+
+
+def test_update_moves_only_the_kinds_it_sets():
+    index = ScheduleIndex()
+    index.load({1: {"practice_time_utc": "09:00", "deadline_time_utc": "18:00"}})
+    index.update(1, {"practice_time_utc": "09:30"})
+    assert index.users_at("practice", "09:00") == []
+    assert index.users_at("practice", "09:30") == [1]
+    assert index.users_at("deadline", "18:00") == [1]
+    index.update(2, {"reminder_time_utc": "12:00"})
+    assert index.users_at("reminder", "12:00") == [2]
+    assert len(index) == 2
+
+
+def test_remove_clears_every_bucket_of_a_user():
+    index = ScheduleIndex()
+    index.load({1: {"practice_time_utc": "09:00", "deadline_time_utc": "18:00"}, 2: {"practice_time_utc": "09:00"}})
+    index.remove(1)
+    index.remove(3)
+    assert index.users_at("practice", "09:00") == [2]
+    assert index.users_at("deadline", "18:00") == []
+    assert len(index) == 1
+
+
+def test_same_local_time_lands_in_each_timezones_utc_bucket():
+    index = ScheduleIndex()
+    index.load({
+        1: utc_settings("Asia/Karachi", practice="09:00"),
+        2: utc_settings("America/New_York", practice="09:00"),
+        3: utc_settings("UTC", practice="09:00"),
+        4: utc_settings("Asia/Kolkata", practice="09:00"),
+    })
+    assert index.users_at("practice", "04:00") == [1]
+    assert index.users_at("practice", "14:00") == [2]
+    assert index.users_at("practice", "09:00") == [3]
+    assert index.users_at("practice", "03:30") == [4]
+
+
+def test_early_morning_local_time_is_due_the_previous_utc_day():
+    settings = utc_settings("Asia/Karachi", practice="02:30", deadline="23:30")
+    assert settings["practice_time_utc"] == "21:30"
+    index = ScheduleIndex()
+    index.load({1: settings})
+    assert index.users_at("practice", "21:30") == [1]
+    assert index.users_at("deadline", "18:30") == [1]
+    # The 21:30 UTC tick on March 1st is already March 2nd for the user,
+    # which is the date their delivery is claimed under.
+    assert local_date(settings, datetime(2026, 3, 1, 21, 30)) == "2026-03-02"
+    assert local_date(settings, datetime(2026, 3, 1, 18, 30)) == "2026-03-01"
+
+
+def test_evening_local_time_is_due_the_next_utc_day():
+    settings = utc_settings("America/Los_Angeles", practice="17:30")
+    assert settings["practice_time_utc"] == "01:30"
+    index = ScheduleIndex()
+    index.load({1: settings})
+    assert index.users_at("practice", "01:30") == [1]
+    assert local_date(settings, datetime(2026, 3, 2, 1, 30)) == "2026-03-01"
@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from bot.sharding import FileShardLease, shard_of
+from bot.storage import MemoryStorage
+
+
+class Clock(datetime):
+    current = datetime(2026, 3, 1, 9, 0)
+
+    @classmethod
+    def utcnow(cls):
+        return cls.current
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    Clock.current = datetime(2026, 3, 1, 9, 0)
+    monkeypatch.setattr("bot.storage.datetime", Clock)
+    return Clock
+
+
+def test_shard_of_is_stable_and_in_range():
+    assert [shard_of(user_id, 4) for user_id in (1, "1")] == [shard_of(1, 4)] * 2
+    assert {shard_of(user_id, 4) for user_id in range(1000)} == {0, 1, 2, 3}
+
+
+def test_file_lease_is_held_until_its_holder_lets_go(tmp_path):
+    holder, other = FileShardLease(str(tmp_path)), FileShardLease(str(tmp_path))
+    path = tmp_path / "dsa-bot-shard-0-of-2.lock"
+
+    assert asyncio.run(holder.acquire("shard-0-of-2", "worker-a", 90))
+    assert asyncio.run(holder.acquire("shard-0-of-2", "worker-a", 90))
+    assert not asyncio.run(other.acquire("shard-0-of-2", "worker-b", 90))
+    assert path.read_text() == "worker-a"
+
+    holder._files.pop("shard-0-of-2").close()
+    assert asyncio.run(other.acquire("shard-0-of-2", "worker-b", 90))
+    assert path.read_text() == "worker-b"
+
+
+def test_lease_is_renewed_by_its_owner(clock):
+    storage = MemoryStorage()
+    assert storage.try_acquire_lease("shard-0-of-2", "worker-a", 90)
+    clock.current += timedelta(seconds=60)
+    assert storage.try_acquire_lease("shard-0-of-2", "worker-a", 90)
+    clock.current += timedelta(seconds=60)
+    assert not storage.try_acquire_lease("shard-0-of-2", "worker-b", 90)
+
+
+def test_expired_lease_is_taken_over(clock):
+    storage = MemoryStorage()
+    assert storage.try_acquire_lease("shard-0-of-2", "worker-a", 90)
+    assert not storage.try_acquire_lease("shard-0-of-2", "worker-b", 90)
+    clock.current += timedelta(seconds=91)
+    assert storage.try_acquire_lease("shard-0-of-2", "worker-b", 90)
+    assert not storage.try_acquire_lease("shard-0-of-2", "worker-a", 90)
+    assert storage.try_acquire_lease("shard-1-of-2", "worker-a", 90)
+
+
+def test_only_one_coordinator_runs_a_shard():
+    pytest.importorskip("firebase_admin")
+    pytest.importorskip("gspread")
+    from bot.models import AsyncFirebaseManager
+    from bot.sharding import ShardCoordinator
+
+    firebase = AsyncFirebaseManager(MemoryStorage(), max_workers=2)
+    first = ShardCoordinator(firebase, worker_id=0, worker_count=2, lease_backend="firestore")
+    second = ShardCoordinator(firebase, worker_id=0, worker_count=2, lease_backend="firestore")
+    assert asyncio.run(first.ensure_lease())
+    assert not asyncio.run(second.ensure_lease())
+    assert asyncio.run(first.ensure_lease())
@@ -0,0 +1,34 @@
+from bot.sources import MemoryCatalogSource, SQLiteCatalogSource
+
+QUESTIONS = [
+    {"Question": "Two Sum", "Topics": "Array", "Companies": "Google", "Difficulty": "Easy"},
+    {"Question": "LRU Cache", "Topics": "Design", "Companies": "Amazon", "Difficulty": "Medium"},
+]
+
+
+def test_sqlite_source_returns_questions_in_order(tmp_path):
+    source = SQLiteCatalogSource(str(tmp_path / "catalog.db"))
+    assert source.get_revision() is None
+    assert source.fetch_questions() == []
+    source.replace_questions(QUESTIONS)
+    assert source.fetch_questions() == QUESTIONS
+
+
+def test_sqlite_source_revision_changes_on_every_replace(tmp_path):
+    path = str(tmp_path / "catalog.db")
+    source = SQLiteCatalogSource(path)
+    source.replace_questions(QUESTIONS)
+    first = source.get_revision()
+    source.replace_questions(QUESTIONS[:1])
+    assert source.get_revision() != first
+    reopened = SQLiteCatalogSource(path)
+    assert reopened.get_revision() == source.get_revision()
+    assert reopened.fetch_questions() == QUESTIONS[:1]
+
+
+def test_memory_source_bumps_its_revision():
+    source = MemoryCatalogSource(QUESTIONS)
+    revision = source.get_revision()
+    source.set_questions(QUESTIONS[:1])
+    assert source.get_revision() != revision
+    assert source.fetch_questions() == QUESTIONS[:1]
@@ -0,0 +1,208 @@
+import sqlite3
+
+import pytest
+
+from bot.storage import LocalWriteBatch, MemoryStorage, SQLiteStorage, Storage, UserSnapshot, next_streak
+
+QUESTION = {"Question": "Two Sum", "Topics": "Array, Hash Table", "Companies": "Google", "Difficulty": "Easy"}
+OTHER = {"Question": "Valid Parentheses", "Topics": "Stack", "Companies": "Amazon", "Difficulty": "Easy"}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def storage(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStorage()
+    return SQLiteStorage(str(tmp_path / "bot.db"))
+
+
+def streak_after(storage, *events, user_id=1):
+    for status, date_str in events:
+        assert storage.update_question_status(user_id, QUESTION, status, date_str)
+    return storage.get_user_snapshot(user_id)
+
+
+def test_first_done_starts_a_streak(storage):
+    snapshot = streak_after(storage, ("done", "2026-03-01"))
+    assert (snapshot.streak, snapshot.longest_streak, snapshot.last_activity_date) == (1, 1, "2026-03-01")
+
+
+def test_second_done_on_the_same_day_keeps_the_streak(storage):
+    snapshot = streak_after(storage, ("done", "2026-03-01"), ("done", "2026-03-01"))
+    assert snapshot.streak == 1
+
+
+def test_done_the_next_day_extends_the_streak(storage):
+    snapshot = streak_after(storage, ("done", "2026-02-28"), ("done", "2026-03-01"), ("done", "2026-03-02"))
+    assert (snapshot.streak, snapshot.longest_streak) == (3, 3)
+
+
+def test_gap_restarts_the_streak_and_keeps_the_longest(storage):
+    snapshot = streak_after(storage, ("done", "2026-03-01"), ("done", "2026-03-02"), ("done", "2026-03-05"))
+    assert (snapshot.streak, snapshot.longest_streak) == (1, 2)
+
+
+def test_missed_then_done_on_the_same_day(storage):
+    snapshot = streak_after(storage, ("done", "2026-03-01"), ("done", "2026-03-02"), ("missed", "2026-03-03"))
+    assert (snapshot.streak, snapshot.longest_streak) == (0, 2)
+    snapshot = streak_after(storage, ("done", "2026-03-03"))
+    assert (snapshot.streak, snapshot.longest_streak) == (1, 2)
+
+
+def test_next_streak_from_empty_data():
+    assert next_streak({}, "2026-03-01")["streak"] == 1
+
+
+def test_streak_on_lapses_after_a_missed_day():
+    snapshot = UserSnapshot(1, {"streak": 4, "last_activity_date": "2026-03-02"})
+    assert snapshot.streak_on("2026-03-02") == 4
+    assert snapshot.streak_on("2026-03-03") == 4
+    assert snapshot.streak_on("2026-03-04") == 0
+    assert UserSnapshot(1).streak_on("2026-03-04") == 0
+
+
+def test_done_updates_progress_and_stats(storage):
+    streak_after(storage, ("done", "2026-03-01"))
+    assert storage.get_user_progress(1)["done"] == storage.get_completed_questions(1)
+    stats = storage.get_user_stats(1)
+    assert stats["done"] == 1
+    assert stats["by_difficulty"]["Easy"]["done"] == 1
+    assert stats["by_topic"]["array"]["done"] == 1
+    assert stats["daily"]["2026-03-01"]["done"] == 1
+
+
+def test_resolve_active_question_ends_it_once(storage):
+    storage.set_active_question(1, QUESTION)
+    assert storage.resolve_active_question(1, "done", "2026-03-01")["Question"] == "Two Sum"
+    assert storage.resolve_active_question(1, "missed", "2026-03-01") is None
+    assert storage.get_active_question(1) is None
+    assert storage.get_user_stats(1).get("missed") is None
+    assert storage.get_user_snapshot(1).streak == 1
+
+
+def test_resolve_active_question_leaves_a_newer_assignment(storage):
+    storage.set_active_question(1, OTHER)
+    assert storage.resolve_active_question(1, "missed", "2026-03-01", question_id="not-the-active-one") is None
+    assert storage.get_active_question(1)["Question"] == "Valid Parentheses"
+
+
+def test_withdrawing_removes_the_pending_entry(storage):
+    storage.set_active_question(1, QUESTION)
+    storage.update_question_status(1, QUESTION, "pending")
+    assert storage.resolve_active_question(1)
+    assert storage.get_user_progress(1)["pending"] == set()
+    assert storage.get_active_question(1) is None
+
+
+def test_settings_sync_cursor_comes_from_the_newest_change(storage):
+    assert storage.get_latest_settings_update() is None
+    storage.set_user_reminder_settings(1, {"practice_time_utc": "09:00"})
+    cursor = storage.get_latest_settings_update()
+    assert cursor.endswith("+00:00")
+    storage.set_user_reminder_settings(2, {"practice_time_utc": "10:00"})
+    changes, cursor = storage.get_reminder_settings_updated_since(cursor)
+    assert changes == {2: {"practice_time_utc": "10:00"}}
+    assert cursor == storage.get_user_data(2)["last_updated"]
+    assert storage.get_reminder_settings_updated_since(cursor) == ({}, cursor)
+    changes, _ = storage.get_reminder_settings_updated_since(None)
+    assert set(changes) == {1, 2}
+
+
+def test_incomplete_backend_fails_at_construction():
+    class Partial(Storage):
+        def get_user_prefs(self, user_id):
+            return {}
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_write_batch_commits_every_queued_op(storage):
+    batch = storage.new_write_batch()
+    assert isinstance(batch, LocalWriteBatch)
+    for user_id in (1, 2):
+        batch.queue_active_question(user_id, QUESTION)
+        batch.queue_question_status(user_id, QUESTION, "pending")
+    assert len(batch) == 4
+    assert batch.flush() == set()
+    assert len(batch) == 0
+    for user_id in (1, 2):
+        assert storage.get_active_question(user_id)["Question"] == "Two Sum"
+        assert len(storage.get_user_progress(user_id)["pending"]) == 1
+
+
+def test_write_batch_fails_only_the_user_whose_write_fails(storage):
+    apply_status = storage._apply_question_status
+
+    def failing(user_id, *args):
+        if user_id == 2:
+            raise RuntimeError("bad write")
+        return apply_status(user_id, *args)
+
+    storage._apply_question_status = failing
+    batch = storage.new_write_batch()
+    for user_id in (1, 2):
+        batch.queue_active_question(user_id, QUESTION)
+        batch.queue_question_status(user_id, QUESTION, "done", "2026-03-01")
+    assert batch.flush() == {2}
+    # The failed first attempt was rolled back, so user 1 is counted once.
+    assert storage.get_user_stats(1)["done"] == 1
+    assert storage.get_active_question(1)["Question"] == "Two Sum"
+    assert storage.get_active_question(2) is None
+    assert storage.get_user_stats(2).get("done") is None
+
+
+def test_delivery_claim_is_create_if_absent(storage):
+    assert storage.claim_delivery(1, "practice", "2026-03-01") is True
+    assert storage.claim_delivery(1, "practice", "2026-03-01") is False
+    assert storage.claim_delivery(1, "reminder", "2026-03-01") is True
+    assert storage.release_delivery(1, "practice", "2026-03-01")
+    assert storage.claim_delivery(1, "practice", "2026-03-01") is True
+
+
+def test_schedule_lookup_follows_settings_changes(storage):
+    storage.set_user_reminder_settings(1, {"practice_time_utc": "09:00", "deadline_time_utc": "18:00"})
+    storage.set_user_reminder_settings(2, {"practice_time_utc": "09:00"})
+    storage.set_user_reminder_settings(3, {"practice_time_utc": "10:00"})
+    assert sorted(s.user_id for s in storage.get_user_snapshots_with_time("practice", "09:00")) == [1, 2]
+    assert [s.user_id for s in storage.get_user_snapshots_with_time("deadline", "18:00")] == [1]
+    storage.set_user_reminder_settings(2, {"practice_time_utc": "10:00"})
+    assert [s.user_id for s in storage.get_user_snapshots_with_time("practice", "09:00")] == [1]
+    assert set(storage.get_all_reminder_settings()) == {1, 2, 3}
+
+
+def test_sqlite_runs_in_wal_mode_with_indexed_schedule_lookups(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "bot.db"))
+    assert storage._query("PRAGMA journal_mode")[0][0] == "wal"
+    plan = " ".join(row[-1] for row in storage._query(
+        "EXPLAIN QUERY PLAN SELECT user_id FROM users WHERE practice_time_utc = ?", ("09:00",)
+    ))
+    assert "users_practice_time" in plan
+
+
+def test_sqlite_transaction_holds_the_write_lock_and_rolls_back(tmp_path):
+    path = str(tmp_path / "bot.db")
+    storage = SQLiteStorage(path)
+    other = sqlite3.connect(path, timeout=0, isolation_level=None)
+    with pytest.raises(RuntimeError):
+        with storage._transaction():
+            storage.set_active_question(1, QUESTION)
+            with storage._transaction():
+                storage.update_question_status(1, QUESTION, "pending")
+            # BEGIN IMMEDIATE took the write lock up front.
+            with pytest.raises(sqlite3.OperationalError):
+                other.execute("BEGIN IMMEDIATE")
+            raise RuntimeError("abort")
+    assert storage.get_active_question(1) is None
+    assert storage.get_user_progress(1)["pending"] == set()
+    other.execute("BEGIN IMMEDIATE")
+    other.execute("ROLLBACK")
+
+
+def test_sqlite_data_survives_reopening(tmp_path):
+    path = str(tmp_path / "bot.db")
+    storage = SQLiteStorage(path)
+    streak_after(storage, ("done", "2026-03-01"))
+    storage.claim_delivery(1, "practice", "2026-03-01")
+    reopened = SQLiteStorage(path)
+    assert reopened.get_user_snapshot(1).streak == 1
+    assert reopened.claim_delivery(1, "practice", "2026-03-01") is False